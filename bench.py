@@ -0,0 +1,246 @@
+import argparse, csv, json, os, subprocess, sys, time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from gkp_numbers import parse_num
+
+# Synthetic inputs shaped like the bundled GKP exports: UTF-16, tab separated, two preamble lines, the planner's
+# full header with twelve "Searches: <month>" columns, and keywords mixing brand/competitor terms, categories,
+# cities and long-tail phrasing. Files are generated once per (kind, rows, seed) and reused across runs.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MONTHS = ["Jul 2024","Aug 2024","Sep 2024","Oct 2024","Nov 2024","Dec 2024","Jan 2025","Feb 2025","Mar 2025","Apr 2025","May 2025","Jun 2025"]
+GKP_HEADER = ["Keyword","Currency","Avg. monthly searches","Three month change","YoY change","Competition","Competition (indexed value)",
+              "Top of page bid (low range)","Top of page bid (high range)","Ad impression share","Organic impression share",
+              "Organic average position","In account?","In plan?"] + [f"Searches: {m}" for m in MONTHS]
+PREAMBLE = ["Keyword Stats 2025-08-08 at 20_56_42", "1 July 2024 - 30 June 2025"]
+
+BRAND_TERMS = ["healthkart", "hk"]
+COMPETITOR_TERMS = ["muscleblaze", "mb"]
+CATEGORIES = ["whey protein","protein powder","whey isolate","creatine","mass gainer","weight gainer","pre workout","bcaa",
+              "multivitamin","omega 3","fish oil","fat burner","sports nutrition","supplements","gym supplements","peanut butter"]
+CITIES = ["mumbai","delhi","bengaluru","bangalore","hyderabad","chennai","pune","kolkata","jaipur","lucknow"]
+LONG_TAIL = ["how to use","what is","benefits","best","for men","for women","for beginners","for weight loss","vs whey","is it safe"]
+MODIFIERS = ["price","online","near me","buy","1kg","2kg","chocolate","unflavoured","original","offer","review","store"]
+VOLUMES = np.array([0, 50, 500, 5000, 50000, 500000]); VOLUME_P = [0.01, 0.6, 0.25, 0.1, 0.035, 0.005]
+COMPETITION = np.array(["High", "Medium", "Low", "Unknown"]); COMPETITION_P = [0.6, 0.1, 0.2, 0.1]
+SYLLABLES = ["ka","ro","mi","ta","ve","lo","su","pa","ni","de","zo","ra","li","mo","ge","fu","bi","ne","to","sa"]
+
+BUILDERS = ("d1", "d2", "d3", "d3-sweep")  # d3-sweep: deliverable 3 with --sweep
+CHUNK = 100_000
+
+def parse_size(s: str) -> int:
+    n = parse_num(s)
+    if n is None or n < 1: raise argparse.ArgumentTypeError(f"bad size {s!r}")
+    return int(n)
+
+def size_label(n: int) -> str:
+    for div, suffix in ((10**6, "M"), (10**3, "k")):
+        if n >= div and n % div == 0: return f"{n // div}{suffix}"
+    return str(n)
+
+def _pick(rng: np.random.Generator, words: List[str], n: int, p_empty: float) -> np.ndarray:
+    out = np.array(words, dtype=object)[rng.integers(0, len(words), n)]
+    out[rng.random(n) < p_empty] = ""
+    return out
+
+def gen_keywords(rng: np.random.Generator, n: int, kind: str) -> List[str]:
+    """[brand|competitor] [category] [modifier] [city | long-tail] [variant word]; empty slots are dropped."""
+    own = BRAND_TERMS if kind == "brand" else COMPETITOR_TERMS
+    variant = np.array([a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES], dtype=object)[rng.integers(0, len(SYLLABLES) ** 3, n)]
+    variant[rng.random(n) < 0.4] = ""
+    slots = [_pick(rng, own, n, 0.4), _pick(rng, CATEGORIES, n, 0.1), _pick(rng, MODIFIERS, n, 0.5),
+             np.where(rng.random(n) < 0.5, _pick(rng, CITIES, n, 0.6), _pick(rng, LONG_TAIL, n, 0.6)), variant]
+    return [" ".join(w for w in row if w) or "supplements" for row in zip(*slots)]
+
+def write_gkp_export(path: str, n: int, kind: str, seed: int = 0) -> str:
+    rng = np.random.default_rng([seed, n, 0 if kind == "brand" else 1])
+    line = "%s\tINR\t%s\t0%%\t0%%\t%s\t%s\t%s\t%s" + "\t" * 5 + "\t%d" * len(MONTHS) + "\n"
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-16", newline="") as f:
+        f.write("\n".join(PREAMBLE) + "\n" + "\t".join(GKP_HEADER) + "\n")
+        for start in range(0, n, CHUNK):
+            m = min(CHUNK, n - start)
+            kws = gen_keywords(rng, m, kind)
+            vol = rng.choice(VOLUMES, m, p=VOLUME_P); comp = rng.choice(COMPETITION, m, p=COMPETITION_P)
+            idx = np.where(comp == "Unknown", "", rng.integers(1, 101, m).astype(str))
+            low = rng.uniform(0.5, 15, m); high = low * rng.uniform(1.5, 6, m); no_bid = rng.random(m) < 0.15
+            lows = np.where(no_bid, "", np.char.mod("%.2f", low)); highs = np.where(no_bid, "", np.char.mod("%.2f", high))
+            monthly = np.rint(vol[:, None] * rng.uniform(0.6, 1.4, (m, len(MONTHS)))).astype(np.int64)
+            f.write("".join([line % (k, v, c, i, lo, hi, *mo) for k, v, c, i, lo, hi, mo in
+                             zip(kws, vol.tolist(), comp.tolist(), idx.tolist(), lows.tolist(), highs.tolist(), monthly.tolist())]))
+    os.replace(tmp, path)
+    return path
+
+def _cached_file(path: str, make) -> str:
+    if not os.path.exists(path): make(path)
+    return path
+
+def d1_inputs(data_dir: str, n: int, seed: int) -> Tuple[str, int]:
+    tag = f"{size_label(n)}_s{seed}"
+    brand = _cached_file(os.path.join(data_dir, f"gkp_brand_{tag}.csv"), lambda p: write_gkp_export(p, n - n // 2, "brand", seed))
+    comp = _cached_file(os.path.join(data_dir, f"gkp_competitor_{tag}.csv"), lambda p: write_gkp_export(p, n // 2, "competitor", seed))
+    with open(os.path.join(ROOT, "config.yaml"), "r", encoding="utf-8") as f: cfg = yaml.safe_load(f)
+    cfg["inputs"] = {"brand_csv": brand, "competitor_csv": comp}
+    cfg["output"] = {"file": os.path.join(data_dir, "out", f"d1_{tag}.xlsx")}
+    path = os.path.join(data_dir, f"d1_{tag}.yaml")
+    with open(path, "w", encoding="utf-8") as f: yaml.safe_dump(cfg, f, sort_keys=False)
+    return path, n
+
+def d2_inputs(data_dir: str, n: int, seed: int) -> Tuple[str, int]:
+    """One theme per 1k GKP rows (at least 10); the planner CSV mixes theme expansions with unrelated keywords."""
+    tag = f"{size_label(n)}_s{seed}"; rng = np.random.default_rng([seed, n, 2])
+    adjectives = ["vegan","organic","plant","grass fed","keto","lean","iso","clear","raw","natural","sugar free","high protein"]
+    nouns = [c for c in CATEGORIES] + ["electrolyte mix","collagen","greens powder","protein bar","meal replacement","recovery drink"]
+    heads = ["best","buy","top","cheap","premium","original","imported","flavoured"]
+    quals = ["for women","for men","low calorie","lactose free","for beginners","for athletes","without side effects","for muscle gain"]
+    tails = ["near me","online","on sale","price","review","combo"]
+    seeds = [f"{a} {b}" for a in adjectives for b in nouns]
+    n_themes = max(10, n // 1000); theme_keys = ["product_categories", "use_cases", "demographics", "seasonal"]
+    themes: Dict[str, List[Dict]] = {k: [] for k in theme_keys}
+    for i in range(n_themes):
+        themes[theme_keys[i % 4]].append({"name": f"Theme {i}", "landing_url": f"https://example.com/t{i}", "priority": ["high","medium","low"][i % 3],
+                                          "seeds": [seeds[j] for j in rng.choice(len(seeds), 3, replace=False)]})
+    gkp = os.path.join(data_dir, f"gkp_planner_{tag}.csv")
+    if not os.path.exists(gkp):
+        # d2 reads UTF-8 comma-separated planner CSVs with headers like "Avg monthly searches"
+        with open(gkp + ".tmp", "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f); w.writerow(["Keyword","Avg monthly searches","Top of page bid low range","Top of page bid high range","Competition"])
+            for start in range(0, n, CHUNK):
+                m = min(CHUNK, n - start)
+                s = np.array(seeds, dtype=object)[rng.integers(0, len(seeds), m)]
+                form = rng.integers(0, 4, m)
+                mod = np.select([form == 1, form == 2, form == 3], [_pick(rng, heads, m, 0), _pick(rng, quals, m, 0), _pick(rng, tails, m, 0)], "")
+                kws = [f"{md} {sd}" if fm == 1 else (f"{sd} {md}" if fm else sd) for sd, md, fm in zip(s, mod, form)]
+                noise = rng.random(m) < 0.3
+                kws = [f"{k} {size_label(int(x))}" if nz else k for k, nz, x in zip(kws, noise, rng.integers(1, 10**6, m))]
+                low = rng.uniform(0.2, 2, m)
+                w.writerows(zip(kws, rng.choice(VOLUMES, m, p=VOLUME_P).tolist(), np.round(low, 2).tolist(), np.round(low * rng.uniform(1.5, 4, m), 2).tolist(),
+                                rng.choice(["Low","Medium","High"], m).tolist()))
+        os.replace(gkp + ".tmp", gkp)
+    cfg = {"global": {"currency": "USD", "language": "en", "geo": "US", "cvr": 0.02}, "themes": themes,
+           "modifiers": {"heads": heads, "qualifiers": quals, "long_tail": tails, "negatives": ["free","pdf","recipe","reddit"], "brand_terms": [], "banned_terms": []},
+           "generation": {"match_types": ["exact","phrase"], "max_keywords_per_theme": 120}, "gkp": {"enabled": True, "csv_path": gkp, "min_volume": 50}}
+    path = os.path.join(data_dir, f"d2_{tag}.yaml")
+    with open(path, "w", encoding="utf-8") as f: yaml.safe_dump(cfg, f, sort_keys=False)
+    return path, n
+
+def d3_inputs(data_dir: str, n: int, seed: int) -> Tuple[str, int]:
+    """n // 100 product groups (at least 30) and a 100-scenario sweep grid."""
+    tag = f"{size_label(n)}_s{seed}"; rng = np.random.default_rng([seed, n, 3]); groups = max(30, n // 100)
+    low = np.round(rng.uniform(0.15, 0.6, groups), 2); high = np.round(low * rng.uniform(1.8, 4, groups), 2)
+    cfg = {"global": {"currency": "USD", "cvr": 0.02, "aov": 45, "target_roas": 3.0},
+           "shopping_bids": [{"product_group": f"Product group {i}", "top_of_page_low": float(lo), "top_of_page_high": float(hi), "competition": str(c), "daily_budget": int(b)}
+                             for i, (lo, hi, c, b) in enumerate(zip(low, high, rng.choice(["Low","Medium","High"], groups), rng.integers(20, 300, groups)))],
+           "sweep": {"target_roas": {"start": 2.0, "stop": 4.0, "num": 5}, "cvr": {"start": 0.01, "stop": 0.03, "num": 5}, "aov": [40, 50], "budget_scale": [0.8, 1.2]}}
+    path = os.path.join(data_dir, f"d3_{tag}.yaml")
+    with open(path, "w", encoding="utf-8") as f: yaml.safe_dump(cfg, f, sort_keys=False)
+    return path, groups
+
+# Runs each builder in a fresh interpreter so peak RSS belongs to that run alone.
+_RUNNER = """
+import atexit, runpy, sys
+try: import resource
+except ImportError: resource = None
+def _rss():
+    if resource is not None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        sys.stderr.write(f"\\nBENCH_MAXRSS_BYTES={kb if sys.platform == 'darwin' else kb * 1024}\\n")
+atexit.register(_rss)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+def run_builder(argv: List[str], env: Optional[Dict] = None) -> Dict:
+    t = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", _RUNNER, *argv], cwd=ROOT, env=env, capture_output=True, text=True)
+    secs = time.perf_counter() - t
+    rss = next((int(l.split("=", 1)[1]) for l in p.stderr.splitlines() if l.startswith("BENCH_MAXRSS_BYTES=")), None)
+    err = "" if p.returncode == 0 else (p.stderr.strip().splitlines() or [f"exit {p.returncode}"])[-1]
+    return {"seconds": round(secs, 4), "peak_rss_mb": round(rss / 2**20, 1) if rss else None, "ok": p.returncode == 0, "error": err}
+
+def builder_argv(builder: str, cfg: str, out_dir: str) -> List[str]:
+    if builder == "d1": return ["build_deliverable1.py", "--config", cfg]
+    if builder == "d2": return ["build_deliverable2.py", "--config", cfg, "--out", os.path.join(out_dir, "d2")]
+    return ["build_deliverable3.py", "--config", cfg, "--out", os.path.join(out_dir, "d3")] + (["--sweep"] if builder == "d3-sweep" else [])
+
+def _git_rev() -> Optional[str]:
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError): return None
+
+def bench_one(builder: str, n: int, data_dir: str, seed: int, warm: bool, stages: bool) -> List[Dict]:
+    cfg, units = {"d1": d1_inputs, "d2": d2_inputs}.get(builder, d3_inputs)(data_dir, n, seed)
+    if builder == "d3-sweep": units *= 100
+    argv = builder_argv(builder, cfg, os.path.join(data_dir, "out"))
+    env = dict(os.environ, SEM_CACHE_DIR=os.path.join(data_dir, "cache"))
+    results = []
+    for mode in (["cold", "warm"] if warm else ["cold"]):
+        res = run_builder(argv + (["--no-cache"] if mode == "cold" else []), env)
+        if mode == "warm" and res["ok"]: res = run_builder(argv, env)  # the first pass only fills the cache
+        res.update(builder=builder, size=n, mode=mode, units=units, units_per_sec=round(units / res["seconds"], 1) if res["ok"] else None)
+        if stages and res["ok"]:
+            trace = os.path.join(data_dir, "out", f"trace_{builder}_{size_label(n)}_{mode}.json")
+            prof = run_builder(argv + (["--no-cache"] if mode == "cold" else []) + ["--profile", "--profile-out", trace], env)
+            if prof["ok"]:
+                with open(trace, "r", encoding="utf-8") as f:
+                    res["stages"] = [{k: r[k] for k in ("stage", "status", "depth", "seconds", "peak_mb")} for r in json.load(f)["stages"]]
+        results.append(res)
+    return results
+
+def previous_results(path: str) -> Dict[Tuple, Dict]:
+    prev: Dict[Tuple, Dict] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try: r = json.loads(line)
+                except ValueError: continue
+                if r.get("ok"): prev[(r["builder"], r["size"], r["mode"])] = r
+    return prev
+
+def print_results(results: List[Dict], prev: Dict[Tuple, Dict]) -> None:
+    print(f"{'builder':<9} {'size':>6} {'mode':<5} {'seconds':>9} {'units/s':>12} {'rss MB':>8} {'vs last':>8}")
+    for r in results:
+        if not r["ok"]:
+            print(f"{r['builder']:<9} {size_label(r['size']):>6} {r['mode']:<5} FAILED: {r['error']}"); continue
+        last = prev.get((r["builder"], r["size"], r["mode"]))
+        delta = f"{(r['seconds'] / last['seconds'] - 1) * 100:+.1f}%" if last else "-"
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['builder']:<9} {size_label(r['size']):>6} {r['mode']:<5} {r['seconds']:>9.2f} {r['units_per_sec']:>12,.0f} {rss:>8} {delta:>8}")
+        for s in r.get("stages", [])[1:]:
+            print(f"{'':<9} {'':>6} {'':<5} {s['seconds']:>9.3f}   {'  ' * (s['depth'] - 1)}{s['stage']} ({s['status']})")
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Benchmark all deliverables on synthetic GKP-shaped inputs")
+    ap.add_argument("--sizes", default="10k,100k", help="comma-separated GKP row counts, e.g. 10k,100k,1M,10M")
+    ap.add_argument("--builders", default="d1,d2,d3,d3-sweep", help=f"subset of {','.join(BUILDERS)}")
+    ap.add_argument("--data-dir", default=os.path.join(".cache", "bench"), help="generated inputs, outputs and traces (reused across runs)")
+    ap.add_argument("--results", default="bench_results.jsonl", help="results are appended here, one JSON object per run")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--warm", action="store_true", help="also time a rerun on a filled cache")
+    ap.add_argument("--no-stages", action="store_true", help="skip the extra --profile run that records per-stage timings")
+    args = ap.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    builders = [b.strip() for b in args.builders.split(",") if b.strip()]
+    unknown = [b for b in builders if b not in BUILDERS]
+    if unknown: raise SystemExit(f"Unknown builders: {', '.join(unknown)} (expected {', '.join(BUILDERS)})")
+    data_dir = os.path.abspath(args.data_dir); os.makedirs(os.path.join(data_dir, "out"), exist_ok=True)
+
+    prev = previous_results(args.results)
+    run = {"run": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_rev(), "python": sys.version.split()[0], "seed": args.seed}
+    results: List[Dict] = []
+    for n in sizes:
+        for b in builders:
+            t = time.perf_counter(); print(f"[{size_label(n)}] {b} ...", end=" ", flush=True)
+            rs = bench_one(b, n, data_dir, args.seed, args.warm, not args.no_stages); results += rs
+            print(f"{time.perf_counter() - t:.1f}s")
+    if os.path.dirname(args.results): os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        for r in results: f.write(json.dumps({**run, **r}) + "\n")
+    print_results(results, prev); print(f"Results appended to {args.results}")
+    if any(not r["ok"] for r in results): raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse, glob, json, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+import build_deliverable1 as d1
+import plan_cache
+
+def find_configs(specs: List[str]) -> List[str]:
+    paths: List[str] = []
+    for spec in specs:
+        if os.path.isdir(spec): paths += sorted(glob.glob(os.path.join(spec, "*.yaml")) + glob.glob(os.path.join(spec, "*.yml")))
+        else: paths += sorted(glob.glob(spec))
+    return list(dict.fromkeys(paths))
+
+def output_path(cfg_path: str, cfg: Dict, out_dir: Optional[str]) -> str:
+    out = cfg["output"]["file"]
+    if not out_dir: return out
+    stem = os.path.splitext(os.path.basename(cfg_path))[0]
+    return os.path.join(out_dir, f"{stem}_{os.path.basename(out)}")
+
+def written_path(out: str, fmt: str) -> str:
+    """What run() writes for out: the workbook itself, or the directory named after it for csv/parquet."""
+    return os.path.normcase(os.path.abspath(out if fmt == "xlsx" else os.path.splitext(out)[0]))
+
+def output_clashes(cfg_paths: List[str], out_dir: Optional[str], fmt: str) -> Dict[str, str]:
+    """An error for every config whose output another config in the batch writes too; none of those are built."""
+    by_out: Dict[str, List[str]] = {}
+    for p in cfg_paths:
+        try: by_out.setdefault(written_path(output_path(p, d1.load_cfg(p), out_dir), fmt), []).append(p)
+        except (Exception, SystemExit): continue  # _run_one reports configs that do not load
+    return {p: f"ValueError: output {out} is also written by {', '.join(q for q in ps if q != p)}; give each config its own output.file"
+            + ("" if out_dir else " or pass --out-dir") for out, ps in by_out.items() if len(ps) > 1 for p in ps}
+
+def _failed(cfg_path: str, error: str) -> Dict:
+    return {"config": cfg_path, "output": None, "keywords": 0, "status": "failed", "error": error, "seconds": 0.0, "stages": []}
+
+def shared_inputs(cfg_paths: List[str]) -> Set[Tuple[str, str]]:
+    inputs: Set[Tuple[str, str]] = set()
+    for p in cfg_paths:
+        try: ins = d1.load_cfg(p).get("inputs", {}) or {}
+        except Exception: continue
+        for key, label in (("brand_csv", "brand"), ("competitor_csv", "competitor")):
+            if isinstance(ins.get(key), str) and os.path.isfile(ins[key]): inputs.add((ins[key], label))
+    return inputs
+
+def _parse_input(path: str, label: str, use_cache: bool) -> None:
+    plan_cache.configure(enabled=use_cache); d1.read_csv_any(path, label)
+
+def _run_one(cfg_path: str, out_dir: Optional[str], use_cache: bool, fmt: str = "xlsx") -> Dict:
+    plan_cache.configure(enabled=use_cache); t = time.perf_counter()
+    res: Dict = {"config": cfg_path, "output": None, "keywords": 0, "status": "ok", "error": "", "seconds": 0.0, "stages": []}
+    try:
+        cfg = d1.load_cfg(cfg_path); out = output_path(cfg_path, cfg, out_dir); res["output"] = out
+        if os.path.dirname(out): os.makedirs(os.path.dirname(out), exist_ok=True)
+        report: List = []; df = d1.run(cfg, out, report, fmt)
+        res["keywords"] = len(df); res["stages"] = [{"stage": n, "status": s, "seconds": round(secs, 4)} for n, s, secs in report]
+    except (Exception, SystemExit) as e:
+        res["status"] = "failed"; res["error"] = f"{type(e).__name__}: {e}"
+    res["seconds"] = round(time.perf_counter() - t, 4)
+    return res
+
+def run_batch(cfg_paths: List[str], out_dir: Optional[str], workers: int, use_cache: bool, fmt: str = "xlsx") -> List[Dict]:
+    """Build every config, parsing each shared input file once up front so workers hit the parse cache.
+    Configs that would write the same output fail without being built."""
+    results: Dict[str, Dict] = {p: _failed(p, err) for p, err in output_clashes(cfg_paths, out_dir, fmt).items()}
+    todo = [p for p in cfg_paths if p not in results]
+    if workers <= 1:
+        for p in todo: results[p] = _run_one(p, out_dir, use_cache, fmt)
+        return [results[p] for p in cfg_paths]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        if use_cache:
+            for f in [ex.submit(_parse_input, path, label, use_cache) for path, label in sorted(shared_inputs(todo))]:
+                try: f.result()
+                except (Exception, SystemExit): pass
+        futs = {ex.submit(_run_one, p, out_dir, use_cache, fmt): p for p in todo}
+        for f in as_completed(futs):
+            p = futs[f]
+            try: results[p] = f.result()
+            except (Exception, SystemExit) as e: results[p] = _failed(p, f"{type(e).__name__}: {e}")
+    return [results[p] for p in cfg_paths]
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Deliverable 1 – batch build across configs")
+    ap.add_argument("configs", nargs="+", help="config files, directories of *.yaml, or glob patterns")
+    ap.add_argument("--out-dir", default=None, help="write each workbook here as <config stem>_<output.file>")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--format", choices=d1.OUTPUT_FORMATS, default="xlsx")
+    ap.add_argument("--summary", default="batch_summary.json")
+    ap.add_argument("--no-cache", action="store_true", help="reparse inputs instead of using the on-disk parse cache")
+    args = ap.parse_args()
+
+    cfg_paths = find_configs(args.configs)
+    if not cfg_paths: raise SystemExit("No configs found.")
+    t = time.perf_counter(); results = run_batch(cfg_paths, args.out_dir, min(args.workers, len(cfg_paths)), not args.no_cache, args.format)
+    summary = {"configs": len(results), "failed": sum(r["status"] != "ok" for r in results), "workers": min(args.workers, len(cfg_paths)),
+               "seconds": round(time.perf_counter() - t, 4), "runs": results}
+    if os.path.dirname(args.summary): os.makedirs(os.path.dirname(args.summary), exist_ok=True)
+    with open(args.summary, "w", encoding="utf-8") as f: json.dump(summary, f, indent=2)
+
+    w = max(len(r["config"]) for r in results)
+    print(f"{'config':<{w}} {'status':<7} {'keywords':>8} {'seconds':>8}")
+    for r in results: print(f"{r['config']:<{w}} {r['status']:<7} {r['keywords']:>8} {r['seconds']:>8.2f}")
+    for r in results:
+        if r["status"] != "ok": print(f"FAILED {r['config']}: {r['error']}")
+    print(f"{summary['configs']} configs, {summary['failed']} failed, {summary['seconds']:.2f}s on {summary['workers']} workers. Summary: {args.summary}")
+    if summary["failed"]: raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-import sys, os, re, json, csv, io
-import pandas as pd, yaml
+import sys, os, re, json, csv, io, time
+from functools import lru_cache
+import numpy as np, pandas as pd, yaml
+from gkp_numbers import parse_num, scale_for, to_num_series
+import plan_cache, plan_profile
+try: import xlsxwriter
+except ImportError: xlsxwriter=None
 
 DEFAULT_CPC={"Brand":(3,8),"Category":(12,35),"Competitor":(10,28),"Location":(12,30),"LongTail":(5,15)}
 CAT_PAT={"Protein/Whey":[r"\bwhey\b",r"\bprotein\b",r"\bprotein powder\b",r"\bwhey isolate\b"],
@@ -7,9 +12,10 @@ CAT_PAT={"Protein/Whey":[r"\bwhey\b",r"\bprotein\b",r"\bprotein powder\b",r"\bwh
          "Pre Workout":[r"\bpre[- ]?workout\b"],"BCAA":[r"\bbcaa\b"],"Multivitamin":[r"\bmultivitamin\b"],
          "Omega 3 / Fish Oil":[r"\bomega ?3\b",r"\bfish oil\b"],"Fat Burner":[r"\bfat burner\b"],
          "Sports Nutrition":[r"\bsports nutrition\b",r"\bbuy supplements online\b"]}
-LT_TRIG=[r"\bhow to\b",r"\bwhat is\b",r"\bvs\b",r"\bbenefits?\b",r"\bbest\b",r"\bfor (men|women|beginners|weight loss)\b",r"\bis .* safe\b"]
+LT_TRIG=[r"\bhow to\b",r"\bwhat is\b",r"\bvs\b",r"\bbenefits?\b",r"\bbest\b",r"\bfor (?:men|women|beginners|weight loss)\b",r"\bis .* safe\b"]
 NEG_SEEDS=["job","jobs","career","salary","wholesale","distributor","free","download","pdf","ppt","torrent","recipe","how to make","side effects","amazon","flipkart","meesho","temu","coupon code","fake","scam","used","olx","quora","reddit","govt","notes","ban","banned"]
 
+@plan_cache.file_cached(version=1)
 def load_cfg(p):
   with open(p,"r",encoding="utf-8") as f: return yaml.safe_load(f)
 
@@ -21,11 +27,7 @@ def norm_hdr(s):
   return s.strip("_")
 
 def to_num(x):
-  if pd.isna(x): return pd.NA
-  s=str(x).lower().replace(",","").replace("₹","").replace("rs.","").replace("rs","").replace("inr","").strip()
-  s=s.replace("--","").replace("—","")
-  try: return float(s)
-  except: return pd.NA
+  v=parse_num(x); return pd.NA if v is None else v
 
 def map_cols(df):
   if df.empty: return df
@@ -33,56 +35,99 @@ def map_cols(df):
   pick=lambda opts: next((c for c in opts if c in df.columns), None)
   out=pd.DataFrame()
   k=pick(["keyword","keywords","keyword_text","plan_keyword","search_term","query","search_keyword"]); out["keyword"]=df[k] if k else ""
-  v=pick(["avg_monthly_searches","average_monthly_searches","avg_monthly_searches_exact_match_only","avg_monthly_searches_(exact_match_only)","search_volume","volume","avg_searches"]); out["avg_monthly_searches"]=df[v].map(to_num) if v else pd.NA
+  v=pick(["avg_monthly_searches","average_monthly_searches","avg_monthly_searches_exact_match_only","avg_monthly_searches_(exact_match_only)","search_volume","volume","avg_searches"]); out["avg_monthly_searches"]=to_num_series(df[v],scale_for(v)) if v else pd.NA
   c=pick(["competition","comp","competition_level","competition_index","competition_indexed_value"]); out["competition"]=df[c] if c else ""
   lo=pick(["top_of_page_bid_low","top_of_page_bid_low_range","top_of_page_bid_low_inr","top_of_page_bid_low_range_inr","top_of_page_bid_low_(inr)","top_of_page_bid_low_micros","low_top_of_page_bid"])
   hi=pick(["top_of_page_bid_high","top_of_page_bid_high_range","top_of_page_bid_high_inr","top_of_page_bid_high_range_inr","top_of_page_bid_high_(inr)","top_of_page_bid_high_micros","high_top_of_page_bid"])
-  out["top_of_page_bid_low"]=df[lo].map(to_num) if lo else pd.NA
-  out["top_of_page_bid_high"]=df[hi].map(to_num) if hi else pd.NA
+  out["top_of_page_bid_low"]=to_num_series(df[lo],scale_for(lo)) if lo else pd.NA
+  out["top_of_page_bid_high"]=to_num_series(df[hi],scale_for(hi)) if hi else pd.NA
   loc=pick(["location","locations","geo","country","city","targeting_location"]); out["location"]=df[loc] if loc else ""
   lp=pick(["landing_page","final_url","url","destination_url","page"]); out["landing_page"]=df[lp] if lp else ""
   out["keyword"]=out["keyword"].astype(str).str.strip().str.lower()
   return out[out["keyword"]!=""]
 
-def read_csv_any(path,label):
-  if not path or not os.path.exists(path):
-    return pd.DataFrame(columns=["keyword","avg_monthly_searches","competition","top_of_page_bid_low","top_of_page_bid_high","location","landing_page","source"])
-  header_markers=("keyword","keyword text","search term","plan keyword","search keyword")
-  for enc in ("utf-16","utf-16-le","utf-16-be","utf-8-sig","utf-8","latin1"):
+INPUT_COLS=["keyword","avg_monthly_searches","competition","top_of_page_bid_low","top_of_page_bid_high","location","landing_page","source"]
+HEADER_MARKERS=("keyword","keyword text","search term","plan keyword","search keyword")
+ENCODINGS=("utf-16","utf-16-le","utf-16-be","utf-8-sig","utf-8","latin1")
+SNIFF_BYTES=1<<20; CHUNK_ROWS=200_000
+
+def sniff_encodings(head):
+  """Candidate encodings for a byte prefix: BOM / NUL-byte layout first, then the generic list."""
+  if head.startswith((b"\xff\xfe",b"\xfe\xff")): first="utf-16"
+  elif head.startswith(b"\xef\xbb\xbf"): first="utf-8-sig"
+  elif head[1::2].count(0)>len(head)//4: first="utf-16-le"
+  elif head[0::2].count(0)>len(head)//4: first="utf-16-be"
+  else: first="utf-8"
+  return list(dict.fromkeys([first,*ENCODINGS]))
+
+def sniff_csv(path,nbytes=SNIFF_BYTES):
+  """Yield (encoding, header_line_index, delimiter) candidates found in the first nbytes of the file."""
+  with open(path,"rb") as f: head=f.read(nbytes)
+  for enc in sniff_encodings(head):
+    lines=io.StringIO(head.decode(enc,errors="ignore"),newline=None).readlines()
+    if len(head)==nbytes: lines=lines[:-1]
+    hdr_idx=next((i for i,ln in enumerate(lines[:600]) if any(m in ln.strip().lower() for m in HEADER_MARKERS) and any(d in ln for d in (",",";","\t","|"))), None)
+    if hdr_idx is None: continue
+    header_line=lines[hdr_idx]
+    try: sep=csv.Sniffer().sniff(header_line, delimiters=",;\t|").delimiter
+    except Exception:
+      counts={",":header_line.count(","), ";":header_line.count(";"), "\t":header_line.count("\t"), "|":header_line.count("|")}
+      sep=max(counts, key=counts.get)
+    yield enc,hdr_idx,sep
+
+@plan_cache.file_cached(version=1)
+def read_csv_any(path,label,chunksize=CHUNK_ROWS):
+  """Stream a GKP-style export through the C parser in chunks, normalizing each chunk with map_cols."""
+  if not path or not os.path.exists(path): return pd.DataFrame(columns=INPUT_COLS)
+  for enc,hdr_idx,sep in sniff_csv(path):
     try:
-      with open(path,"r",encoding=enc,errors="ignore") as f: lines=f.readlines()
-      hdr_idx=None
-      for i,ln in enumerate(lines[:600]):
-        s=ln.strip().lower()
-        if any(m in s for m in header_markers) and any(d in ln for d in (",",";","\t","|")):
-          hdr_idx=i; break
-      if hdr_idx is None: continue
-      header_line=lines[hdr_idx]
-      try: sep=csv.Sniffer().sniff(header_line, delimiters=",;\t|").delimiter
-      except Exception:
-        counts={",":header_line.count(","), ";":header_line.count(";"), "\t":header_line.count("\t"), "|":header_line.count("|")}
-        sep=max(counts, key=counts.get)
-      body="".join(lines[hdr_idx:])
-      df=pd.read_csv(io.StringIO(body), sep=sep, header=0, engine="python", dtype=str, on_bad_lines="skip")
-      if df.shape[1]<2: continue
-      mapped=map_cols(df)
+      parts=[]
+      with open(path,"r",encoding=enc,errors="ignore") as f:
+        for _ in range(hdr_idx): f.readline()
+        for chunk in pd.read_csv(f, sep=sep, header=0, dtype=str, on_bad_lines="skip", chunksize=chunksize):
+          if chunk.shape[1]<2: break
+          parts.append(map_cols(chunk))
+      mapped=pd.concat(parts) if parts else pd.DataFrame()
       if not mapped.empty:
         mapped["source"]=label
         return mapped
     except Exception: continue
-  return pd.DataFrame(columns=["keyword","avg_monthly_searches","competition","top_of_page_bid_low","top_of_page_bid_high","location","landing_page","source"])
+  return pd.DataFrame(columns=INPUT_COLS)
+
+# Rules are compiled once into alternation regexes and reused by both the scalar helpers and the
+# column-wise classify(); a keyword matches a combined pattern iff it matches one of its members.
+INTENTS=["Brand","Competitor","Location","LongTail"]
+_NEVER=re.compile(r"(?!)")
+LT_RX=re.compile("|".join(f"(?:{p})" for p in LT_TRIG))
+CAT_RX={b:re.compile("|".join(f"(?:{p})" for p in ps)) for b,ps in CAT_PAT.items()}
+
+@lru_cache(maxsize=64)
+def _terms_rx(terms):
+  if not terms: return _NEVER
+  return re.compile(r"(?:^|[^a-z0-9])(?:"+"|".join(re.escape(x.lower()) for x in sorted(terms))+r")(?:[^a-z0-9]|$)")
+@lru_cache(maxsize=64)
+def _substr_rx(terms):
+  if not terms: return _NEVER
+  return re.compile("|".join(re.escape(x.lower()) for x in sorted(terms)))
+def _city_terms(cities): return frozenset([*cities,"bangalore"])
 
-def contains_any(t,terms): t=t.lower(); return any(re.search(rf"(^|[^a-z0-9]){re.escape(x.lower())}([^a-z0-9]|$)",t) for x in terms)
+def contains_any(t,terms): return _terms_rx(frozenset(terms)).search(t.lower()) is not None
 def intent_of(k,brand,comp,cities):
   if contains_any(k,brand): return "Brand"
   if contains_any(k,comp): return "Competitor"
-  if any(c.lower() in k for c in set([*cities,"bangalore"])): return "Location"
-  if any(re.search(p,k) for p in LT_TRIG): return "LongTail"
+  if _substr_rx(_city_terms(cities)).search(k): return "Location"
+  if LT_RX.search(k): return "LongTail"
   return "Category"
-def bucket_of(k):
-  for b,ps in CAT_PAT.items():
-    if any(re.search(p,k) for p in ps): return b
-  return "Other"
+def bucket_of(k): return next((b for b,rx in CAT_RX.items() if rx.search(k)), "Other")
+
+def classify(kw,brand,comp,cities):
+  """Column-wise intent_of/bucket_of: one pass per combined rule instead of one regex per term per keyword."""
+  kw=kw.astype(str); low=kw.str.lower()
+  hits=[low.str.contains(_terms_rx(frozenset(brand))),low.str.contains(_terms_rx(frozenset(comp))),
+        kw.str.contains(_substr_rx(_city_terms(cities))),kw.str.contains(LT_RX)]
+  intent=pd.Series(np.select(hits,INTENTS,"Category"),index=kw.index,dtype=object)
+  bucket=pd.Series(np.select([kw.str.contains(rx) for rx in CAT_RX.values()],list(CAT_RX),"Other"),index=kw.index,dtype=object)
+  return intent,bucket
 def match_type(intent,k): return "Exact" if intent in ("Brand","Location") and len(k.split())<=3 else "Phrase"
 def cpc_suggest(intent,low,high):
   if pd.notna(low) or pd.notna(high):
@@ -115,96 +160,261 @@ def fill_locations(df, cfg):
   df["location"]=out
   return df
 
-def build(cfg):
-  b=read_csv_any(cfg["inputs"]["brand_csv"],"brand"); c=read_csv_any(cfg["inputs"]["competitor_csv"],"competitor")
+def stage_ingest(_,cfg):
+  with plan_profile.stage("read_csv_any brand"): b=read_csv_any(cfg["inputs"]["brand_csv"],"brand")
+  with plan_profile.stage("read_csv_any competitor"): c=read_csv_any(cfg["inputs"]["competitor_csv"],"competitor")
   df=pd.concat([b,c],ignore_index=True)
   if df.empty: df=fallback_rows(cfg)
-  df=df.drop_duplicates(subset=["keyword"])
+  return df.drop_duplicates(subset=["keyword"])
+
+CAMPAIGNS={"Brand":"Search - Brand","Competitor":"Search - Competitor","Location":"Search - Location","LongTail":"Search - LongTail","Category":"Search - Category"}
+
+def location_city(kw,cities):
+  """First configured city named in each keyword, else Bengaluru for "bangalore", else General."""
+  kw=kw.astype(str)
+  return pd.Series(np.select([kw.str.contains(c.lower(),regex=False) for c in cities]+[kw.str.contains("bangalore",regex=False)],[*cities,"Bengaluru"],"General"),index=kw.index,dtype=object)
+
+def stage_classify(df,cfg):
   bt=[cfg["brand"]["name"],*cfg["brand"].get("brand_terms",[])]; ct=[cfg["competitor"]["name"],*cfg["competitor"].get("competitor_terms",[])]; cities=cfg["targeting"].get("locations",[])
-  df["intent"]=df["keyword"].apply(lambda k:intent_of(k,bt,ct,cities))
-  ads=[]
-  for k,i in zip(df["keyword"],df["intent"]):
-    if i=="Brand": ads.append("Brand Terms")
-    elif i=="Competitor": ads.append("Competitor Terms")
-    elif i=="Location":
-      city=next((c for c in cities if c.lower() in k), None) or ("Bengaluru" if "bangalore" in k else "General"); ads.append(f"Location - {city}")
-    elif i=="LongTail": ads.append("Long-Tail Informational Queries")
-    else: ads.append(f"Category - {bucket_of(k)}")
-  df["ad_group"]=ads
-  df["campaign"]=df["intent"].map({"Brand":"Search - Brand","Competitor":"Search - Competitor","Location":"Search - Location","LongTail":"Search - LongTail","Category":"Search - Category"}).fillna("Search - Other")
-  mts,lows,highs,maxes=[],[],[],[]
-  for k,i,lo,hi in zip(df["keyword"],df["intent"],df.get("top_of_page_bid_low"),df.get("top_of_page_bid_high")):
-    l,h,m=cpc_suggest(i,lo,hi); mts.append(match_type(i,k)); lows.append(l); highs.append(h); maxes.append(m)
-  df["match_type"]=mts; df["suggested_cpc_low_inr"]=lows; df["suggested_cpc_high_inr"]=highs; df["suggested_max_cpc_inr"]=maxes
+  df["intent"],bucket=classify(df["keyword"],bt,ct,cities); i=df["intent"]
+  df["ad_group"]=np.select([i=="Brand",i=="Competitor",i=="Location",i=="LongTail"],
+    ["Brand Terms","Competitor Terms","Location - "+location_city(df["keyword"],cities),"Long-Tail Informational Queries"],"Category - "+bucket).astype(object)
+  df["campaign"]=df["intent"].map(CAMPAIGNS).fillna("Search - Other")
+  return df
+
+def _round2(a):
+  """np.round(a,2) matching Python's round(): values whose x*100 lands on a .5 tie are redone with round()."""
+  r=np.round(a,2); x=a*100; tie=np.abs(np.abs(x-np.trunc(x))-0.5)<1e-6
+  if tie.any(): r[tie]=[round(float(v),2) for v in a[tie]]
+  return r
+
+def stage_cpc(df,cfg):
+  """Column-wise match_type/cpc_suggest."""
+  i=df["intent"]; lo=pd.to_numeric(df["top_of_page_bid_low"],errors="coerce").to_numpy(float); hi=pd.to_numeric(df["top_of_page_bid_high"],errors="coerce").to_numpy(float)
+  has_lo,has_hi=~np.isnan(lo),~np.isnan(hi)
+  l=np.select([has_lo,has_hi],[lo,hi*0.6],i.map({k:v[0] for k,v in DEFAULT_CPC.items()}).to_numpy(float))
+  h=np.select([has_hi,has_lo],[hi,lo*1.4],i.map({k:v[1] for k,v in DEFAULT_CPC.items()}).to_numpy(float))
+  df["match_type"]=np.where(i.isin(["Brand","Location"])&(df["keyword"].astype(str).str.count(r"\S+")<=3),"Exact","Phrase").astype(object)
+  df["suggested_cpc_low_inr"]=_round2(l); df["suggested_cpc_high_inr"]=_round2(h); df["suggested_max_cpc_inr"]=_round2((l+h)/2)
+  return df
+
+def stage_filter(df,cfg):
   vol=pd.to_numeric(df["avg_monthly_searches"],errors="coerce")
   if vol.notna().any(): df=df[vol>=cfg["filters"]["min_search_volume"]]
   k=cfg["filters"].get("max_keywords_per_group")
-  if k: df=df.groupby(["campaign","ad_group"],as_index=False).apply(lambda g:g.sort_values("avg_monthly_searches",ascending=False,na_position="last").head(k)).reset_index(drop=True)
-  df["category_bucket"]=df["ad_group"].str.replace("Category - ","",regex=False)
-  df=fill_locations(df,cfg)
+  if k:
+    df=df.sort_values(["campaign","ad_group","avg_monthly_searches"],ascending=[True,True,False],na_position="last",kind="stable")
+    df=df[df.groupby(["campaign","ad_group"]).cumcount()<k].reset_index(drop=True)
   return df
 
+def stage_locations(df,cfg):
+  df["category_bucket"]=df["ad_group"].str.replace("Category - ","",regex=False)
+  return fill_locations(df,cfg)
+
+def forecasts(df,cfg,idx=None):
+  idx=idx if idx is not None else group_index(df)
+  return {"Summary":idx.sort_values(["campaign","ad_group"])[["campaign","ad_group","keywords"]].reset_index(drop=True),
+          "Forecast_2pc_CVR":forecast_search(df,cfg,idx),"Shopping_Structure":shopping_structure(df,cfg,idx),"PMax_Asset_Groups":pmax_assets(df,cfg,idx)}
+
+# (name, config sections it reads, fn(state,cfg)). A stage's cache key chains the previous stage's key with its own
+# config slice (input files by content), so an edit only reruns the first stage that reads it and everything after.
+# Bump PIPELINE_VERSION whenever a stage's output changes.
+PIPELINE_VERSION=3
+BUILD_STAGES=[("ingest",["inputs","targeting.locations"],stage_ingest),
+              ("classify",["brand","competitor","targeting.locations"],stage_classify),
+              ("cpc",[],stage_cpc),
+              ("filter",["filters"],stage_filter),
+              ("locations",["targeting"],stage_locations)]
+FORECAST_STAGES=[("forecast",["budgets"],forecasts)]
+
+def _cfg_part(cfg,dotted):
+  v=cfg
+  for k in dotted.split("."): v=v.get(k) if isinstance(v,dict) else None
+  return v
+def _fingerprint(v):
+  if isinstance(v,dict): return sorted((k,_fingerprint(x)) for k,x in v.items())
+  if isinstance(v,(list,tuple)): return [_fingerprint(x) for x in v]
+  if isinstance(v,str) and os.path.isfile(v): return (v,plan_cache.file_digest(v))
+  return v
+
+def run_stages(cfg,stages,state=None,key="",report=None):
+  """Run stages in order, resuming from the latest one whose result is cached. Returns (state, last key)."""
+  keys=[]
+  if plan_cache.ENABLED:  # keys hash the input files, which is wasted work when there is no cache to look them up in
+    for name,deps,_ in stages:
+      key=plan_cache.make_key(key,PIPELINE_VERSION,name,[(d,_fingerprint(_cfg_part(cfg,d))) for d in deps]); keys.append(key)
+  start=0
+  for i in range(len(keys)-1,-1,-1):
+    t=time.perf_counter(); hit,val=plan_cache.load(keys[i])
+    if hit: state,start=val,i+1; loaded=(i,time.perf_counter()-t); break
+  for i,(name,_,fn) in enumerate(stages):
+    if i<start:
+      if report is not None: report.append((name,"cached",loaded[1] if i==loaded[0] else 0.0))
+      plan_profile.record(name,"cached",loaded[1] if i==loaded[0] else 0.0); continue
+    with plan_profile.stage(name):
+      t=time.perf_counter(); state=fn(state,cfg); secs=time.perf_counter()-t
+      if keys:
+        with plan_profile.stage("store"): plan_cache.store(keys[i],state)
+    if report is not None: report.append((name,"ran",secs))
+  return state,keys[-1] if keys else key
+
+def build(cfg,report=None): return run_stages(cfg,BUILD_STAGES,report=report)[0]
+
+def group_index(df):
+  """One groupby pass per (campaign, ad_group), in first-seen order: keyword count, first three keywords, mean max CPC, total volume."""
+  keys=["campaign","ad_group"]
+  idx=df.groupby(keys,sort=False).agg(keywords=("keyword","size"),avg_cpc_inr=("suggested_max_cpc_inr","mean"),vol=("avg_monthly_searches","sum"))
+  idx["example_keywords"]=df.groupby(keys,sort=False).head(3).groupby(keys,sort=False)["keyword"].agg(", ".join)
+  return idx.reset_index()
+
+def _category_groups(idx):
+  cat=idx[idx["ad_group"].str.startswith("Category -",na=False)].copy(); cat["category_bucket"]=cat["ad_group"].str.replace("Category - ","",regex=False)
+  return cat.sort_values("category_bucket").reset_index(drop=True)
+
 def _forecast_share(g,tot): return 1/len(g) if tot<=0 else g/tot
 def _add_roas_cols(df,aov):
   df["cpa_inr"]=df["avg_cpc_inr"]/0.02; df["revenue_inr"]=df["est_conversions"]*(aov or 0)
   df["roas"]=df["revenue_inr"]/df["budget_inr"].replace(0, pd.NA); return df
 
-def forecast_search(df,cfg):
+def forecast_search(df,cfg,idx=None):
   b=cfg.get("budgets",{}).get("search_monthly_inr",0) or 0; aov=cfg.get("budgets",{}).get("aov_inr",0) or 0
   if b<=0 or df.empty: return pd.DataFrame(columns=["campaign","ad_group","budget_inr","avg_cpc_inr","est_clicks","est_conversions","cpa_inr","revenue_inr","roas"])
-  g=df.groupby(["campaign","ad_group"]).agg(avg_cpc_inr=("suggested_max_cpc_inr","mean"), vol=("avg_monthly_searches","sum")).reset_index()
+  idx=idx if idx is not None else group_index(df)
+  g=idx.sort_values(["campaign","ad_group"])[["campaign","ad_group","avg_cpc_inr","vol"]].reset_index(drop=True)
   g["share"]=_forecast_share(g["vol"].fillna(0), g["vol"].fillna(0).sum()); g["budget_inr"]=g["share"]*b
   g["est_clicks"]=g["budget_inr"]/g["avg_cpc_inr"].clip(lower=1e-6); g["est_conversions"]=g["est_clicks"]*0.02
-  return _add_roas_cols(g[["campaign","ad_group","budget_inr","avg_cpc_inr","est_clicks","est_conversions"]],aov)
+  return _add_roas_cols(g[["campaign","ad_group","budget_inr","avg_cpc_inr","est_clicks","est_conversions"]].copy(),aov)
 
-def shopping_structure(df,cfg):
+def shopping_structure(df,cfg,idx=None):
   b=cfg.get("budgets",{}).get("shopping_monthly_inr",0) or 0; aov=cfg.get("budgets",{}).get("aov_inr",0) or 0
-  cat=df[df["ad_group"].str.startswith("Category -",na=False)].copy()
+  cat=_category_groups(idx if idx is not None else group_index(df))
   if cat.empty or b<=0: return pd.DataFrame(columns=["campaign","ad_group","product_theme","example_keywords","budget_inr","avg_cpc_inr","est_clicks","est_conversions","cpa_inr","revenue_inr","roas"])
-  top=cat.groupby("category_bucket").size().reset_index(name="kws"); top["share"]=top["kws"]/top["kws"].sum(); top["budget_inr"]=top["share"]*b
-  ex=cat.groupby("category_bucket")["keyword"].apply(lambda s:", ".join(s.head(3))).reset_index(name="example_keywords")
-  m=top.merge(ex,on="category_bucket",how="left"); m["avg_cpc_inr"]=(DEFAULT_CPC["Category"][0]+DEFAULT_CPC["Category"][1])/2
+  m=cat[["category_bucket","example_keywords"]].assign(kws=cat["keywords"]); m["share"]=m["kws"]/m["kws"].sum(); m["budget_inr"]=m["share"]*b
+  m["avg_cpc_inr"]=(DEFAULT_CPC["Category"][0]+DEFAULT_CPC["Category"][1])/2
   m["est_clicks"]=m["budget_inr"]/m["avg_cpc_inr"]; m["est_conversions"]=m["est_clicks"]*0.02; m=_add_roas_cols(m,aov)
   m["campaign"]="Shopping - Standard"; m["ad_group"]=m["category_bucket"]; m["product_theme"]=m["category_bucket"]
   return m[["campaign","ad_group","product_theme","example_keywords","budget_inr","avg_cpc_inr","est_clicks","est_conversions","cpa_inr","revenue_inr","roas"]]
 
-def pmax_assets(df,cfg):
+def pmax_assets(df,cfg,idx=None):
   b=cfg.get("budgets",{}).get("pmax_monthly_inr",0) or 0; aov=cfg.get("budgets",{}).get("aov_inr",0) or 0
-  brand=df[df["intent"]=="Brand"]["keyword"].head(5); cat=df[df["ad_group"].str.startswith("Category -",na=False)]; loc=df[df["intent"]=="Location"]
+  idx=idx if idx is not None else group_index(df)
+  brand=df[df["intent"]=="Brand"]["keyword"].head(5); cat=_category_groups(idx); loc=idx[idx["campaign"]=="Search - Location"]
   rows=[]; b_brand,b_cat,b_loc=b*0.3,b*0.5,b*0.2
   if not brand.empty:
     cpc=(DEFAULT_CPC["Brand"][0]+DEFAULT_CPC["Brand"][1])/2; clicks=b_brand/max(cpc,1e-6); conv=clicks*0.02
     rows.append({"campaign":"PMax - Core","asset_group":"Brand","audience_hint":"brand searchers","example_keywords":", ".join(brand),"budget_inr":b_brand,"avg_cpc_inr":cpc,"est_clicks":clicks,"est_conversions":conv})
   if not cat.empty:
-    top=cat.groupby("category_bucket").size().reset_index(name="kws"); top["share"]=top["kws"]/top["kws"].sum()
+    top=cat[["category_bucket","keywords","example_keywords"]].rename(columns={"keywords":"kws"}); top["share"]=top["kws"]/top["kws"].sum()
     for _,r in top.sort_values("kws",ascending=False).head(5).iterrows():
-      ex=", ".join(cat[cat["category_bucket"]==r["category_bucket"]]["keyword"].head(3))
       cpc=(DEFAULT_CPC["Category"][0]+DEFAULT_CPC["Category"][1])/2; bud=b_cat*r["share"]; clicks=bud/max(cpc,1e-6); conv=clicks*0.02
-      rows.append({"campaign":"PMax - Core","asset_group":f"Category - {r['category_bucket']}","audience_hint":"in-market sports nutrition","example_keywords":ex,"budget_inr":bud,"avg_cpc_inr":cpc,"est_clicks":clicks,"est_conversions":conv})
+      rows.append({"campaign":"PMax - Core","asset_group":f"Category - {r['category_bucket']}","audience_hint":"in-market sports nutrition","example_keywords":r["example_keywords"],"budget_inr":bud,"avg_cpc_inr":cpc,"est_clicks":clicks,"est_conversions":conv})
   if not loc.empty:
-    cities=loc["ad_group"].str.replace("Location - ","",regex=False).value_counts().index.tolist()
+    # same tie order as value_counts(): counts in first-seen order, then sorted descending
+    by_city=pd.Series(loc["keywords"].to_numpy(),index=loc["ad_group"].str.replace("Location - ","",regex=False))
+    ex=dict(zip(loc["ad_group"],loc["example_keywords"])); cities=by_city.sort_values(ascending=False).index.tolist()
     per=b_loc/max(len(cities),1); cpc=(DEFAULT_CPC["Location"][0]+DEFAULT_CPC["Location"][1])/2
     for city in cities:
-      ex=", ".join(loc[loc["ad_group"]==f"Location - {city}"]["keyword"].head(3)); clicks=per/max(cpc,1e-6); conv=clicks*0.02
-      rows.append({"campaign":"PMax - Core","asset_group":f"Location - {city}","audience_hint":"geo intent","example_keywords":ex,"budget_inr":per,"avg_cpc_inr":cpc,"est_clicks":clicks,"est_conversions":conv})
+      clicks=per/max(cpc,1e-6); conv=clicks*0.02
+      rows.append({"campaign":"PMax - Core","asset_group":f"Location - {city}","audience_hint":"geo intent","example_keywords":ex.get(f"Location - {city}",""),"budget_inr":per,"avg_cpc_inr":cpc,"est_clicks":clicks,"est_conversions":conv})
   out=pd.DataFrame(rows)
   return _add_roas_cols(out,aov)[["campaign","asset_group","audience_hint","example_keywords","budget_inr","avg_cpc_inr","est_clicks","est_conversions","cpa_inr","revenue_inr","roas"]]
 
-def write_excel(path,df,cfg):
-  with pd.ExcelWriter(path,engine="openpyxl") as w:
-    cols=["campaign","ad_group","keyword","match_type","suggested_max_cpc_inr","suggested_cpc_low_inr","suggested_cpc_high_inr","avg_monthly_searches","competition","top_of_page_bid_low","top_of_page_bid_high","location","landing_page","source","intent","category_bucket"]
-    df[cols].to_excel(w,index=False,sheet_name="AdGroups")
-    df.groupby(["campaign","ad_group"]).size().reset_index(name="keywords").to_excel(w,index=False,sheet_name="Summary")
-    forecast_search(df,cfg).to_excel(w,index=False,sheet_name="Forecast_2pc_CVR")
-    pd.DataFrame({"negative_keyword":NEG_SEEDS}).to_excel(w,index=False,sheet_name="Negatives")
-    shopping_structure(df,cfg).to_excel(w,index=False,sheet_name="Shopping_Structure")
-    pmax_assets(df,cfg).to_excel(w,index=False,sheet_name="PMax_Asset_Groups")
-    bd=cfg.get("budgets",{}); pd.DataFrame([{"shopping_monthly_inr":bd.get("shopping_monthly_inr"),"search_monthly_inr":bd.get("search_monthly_inr"),"pmax_monthly_inr":bd.get("pmax_monthly_inr"),"aov_inr":bd.get("aov_inr")}]).to_excel(w,index=False,sheet_name="Budgets")
-    pd.DataFrame([{"config_json":json.dumps(cfg,indent=2)}]).to_excel(w,index=False,sheet_name="Config")
+ADGROUP_COLS=["campaign","ad_group","keyword","match_type","suggested_max_cpc_inr","suggested_cpc_low_inr","suggested_cpc_high_inr","avg_monthly_searches","competition","top_of_page_bid_low","top_of_page_bid_high","location","landing_page","source","intent","category_bucket"]
+
+def plan_sheets(df,cfg,fc=None):
+  fc=fc if fc is not None else forecasts(df,cfg); bd=cfg.get("budgets",{})
+  return {"AdGroups":df[ADGROUP_COLS],
+          "Summary":fc["Summary"],
+          "Forecast_2pc_CVR":fc["Forecast_2pc_CVR"],
+          "Negatives":pd.DataFrame({"negative_keyword":NEG_SEEDS}),
+          "Shopping_Structure":fc["Shopping_Structure"],
+          "PMax_Asset_Groups":fc["PMax_Asset_Groups"],
+          "Budgets":pd.DataFrame([{"shopping_monthly_inr":bd.get("shopping_monthly_inr"),"search_monthly_inr":bd.get("search_monthly_inr"),"pmax_monthly_inr":bd.get("pmax_monthly_inr"),"aov_inr":bd.get("aov_inr")}]),
+          "Config":pd.DataFrame([{"config_json":json.dumps(cfg,indent=2)}])}
+
+def _rows(sheet,chunk=50_000):
+  for i in range(0,len(sheet),chunk):
+    part=sheet.iloc[i:i+chunk].astype(object); yield from part.where(part.notna(),None).itertuples(index=False,name=None)
+
+def _write_xlsxwriter(path,sheets):
+  wb=xlsxwriter.Workbook(path,{"constant_memory":True,"strings_to_urls":False,"strings_to_formulas":False}); bold=wb.add_format({"bold":True,"border":1})
+  for name,sheet in sheets.items():
+    with plan_profile.stage(f"sheet {name}"):
+      ws=wb.add_worksheet(name); ws.write_row(0,0,[str(c) for c in sheet.columns],bold)
+      for r,row in enumerate(_rows(sheet),1): ws.write_row(r,0,row)
+  with plan_profile.stage("close workbook"): wb.close()
+
+def _write_openpyxl(path,sheets):
+  from openpyxl import Workbook
+  from openpyxl.cell import WriteOnlyCell
+  from openpyxl.styles import Font
+  wb=Workbook(write_only=True)
+  for name,sheet in sheets.items():
+    with plan_profile.stage(f"sheet {name}"):
+      ws=wb.create_sheet(name); hdr=[]
+      for c in sheet.columns: cell=WriteOnlyCell(ws,value=str(c)); cell.font=Font(bold=True); hdr.append(cell)
+      ws.append(hdr)
+      for row in _rows(sheet): ws.append(row)
+  with plan_profile.stage("save workbook"): wb.save(path)
+
+EXCEL_MAX_ROWS=1_048_576  # per sheet, header included
+def check_excel_rows(sheets):
+  """Neither streaming writer fails past Excel's row limit (xlsxwriter's write_row just returns -1), so check up front."""
+  for name,sheet in sheets.items():
+    if len(sheet)+1>EXCEL_MAX_ROWS:
+      raise ValueError(f"Sheet {name} has {len(sheet):,} rows but an Excel sheet holds {EXCEL_MAX_ROWS-1:,} below the header. Use --format csv or --format parquet, or cap filters.max_keywords_per_group.")
+
+def write_excel(path,df,cfg,fc=None):
+  """Stream the workbook row by row: xlsxwriter in constant_memory mode when installed, else openpyxl write-only."""
+  sheets=plan_sheets(df,cfg,fc); check_excel_rows(sheets)
+  (_write_xlsxwriter if xlsxwriter else _write_openpyxl)(path,sheets)
+  return path
+
+def write_sheet_files(path,df,cfg,fc=None,fmt="csv"):
+  """One file per sheet in a directory named after path (without extension); the config goes to Config.json."""
+  if fmt=="parquet":
+    try: import pyarrow  # noqa: F401
+    except ImportError: raise SystemExit("pyarrow not installed. Run: pip install pyarrow")
+  d=os.path.splitext(path)[0]; os.makedirs(d,exist_ok=True)
+  for name,sheet in plan_sheets(df,cfg,fc).items():
+    with plan_profile.stage(f"sheet {name}"):
+      if name=="Config":
+        with open(os.path.join(d,"Config.json"),"w",encoding="utf-8") as f: json.dump(cfg,f,indent=2)
+      elif fmt=="csv": sheet.to_csv(os.path.join(d,f"{name}.csv"),index=False)
+      else: sheet.to_parquet(os.path.join(d,f"{name}.parquet"),index=False)
+  return d
+
+OUTPUT_FORMATS=("xlsx","csv","parquet")
+def write_plan(path,df,cfg,fc=None,fmt="xlsx"):
+  if fmt not in OUTPUT_FORMATS: raise ValueError(f"Unknown output format {fmt!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+  return write_excel(path,df,cfg,fc) if fmt=="xlsx" else write_sheet_files(path,df,cfg,fc,fmt)
+
+def print_report(report):
+  print(f"{'stage':<10} {'status':<7} {'ms':>9}")
+  for name,status,secs in report: print(f"{name:<10} {status:<7} {secs*1000:>9.1f}")
+
+def run(cfg,out,report=None,fmt="xlsx"):
+  """Build the plan for cfg and write it to out in fmt; returns the AdGroups frame."""
+  report=report if report is not None else []
+  df,key=run_stages(cfg,BUILD_STAGES,report=report); fc,_=run_stages(cfg,FORECAST_STAGES,state=df,key=key,report=report)
+  t=time.perf_counter()
+  with plan_profile.stage("write"): write_plan(out,df,cfg,fc,fmt)
+  report.append(("write","ran",time.perf_counter()-t))
+  return df
+
+def _arg(flag,default=None): return sys.argv[sys.argv.index(flag)+1] if flag in sys.argv else default
 
 def main():
-  cfg_path=sys.argv[sys.argv.index("--config")+1] if "--config" in sys.argv else "config.yaml"
-  cfg=load_cfg(cfg_path); out=cfg["output"]["file"]; df=build(cfg)
-  write_excel(out,df,cfg); print(f"Wrote {out} with {len(df)} keywords.")
+  cfg_path=_arg("--config","config.yaml")
+  if "--no-cache" in sys.argv: plan_cache.configure(enabled=False)
+  prof=plan_profile.profiling("deliverable1","--profile" in sys.argv,_arg("--profile-out"),_arg("--cprofile"))
+  with prof:
+    with plan_profile.stage("load_cfg"): cfg=load_cfg(cfg_path)
+    out=cfg["output"]["file"]; report=[]
+    fmt=_arg("--format",cfg["output"].get("format","xlsx"))
+    if fmt not in OUTPUT_FORMATS: raise SystemExit(f"Unknown output format {fmt!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+    df=run(cfg,out,report,fmt)
+  print(f"Wrote {out if fmt=='xlsx' else os.path.splitext(out)[0]} with {len(df)} keywords.")
+  if not plan_profile.RECORDS: print_report(report)
 
 if __name__=="__main__": main()
\ No newline at end of file
@@ -1,5 +1,14 @@
-﻿import argparse, csv, json, math, os
-from typing import Dict, List, Set, Tuple, Optional
+﻿import argparse, csv, hashlib, json, multiprocessing, os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Set, Tuple, Optional
+
+import numpy as np
+
+import plan_cache, plan_profile
+from gkp_numbers import parse_num, scale_for
 
 try:
     import yaml
@@ -8,12 +17,14 @@ except ImportError:
 
 THEME_KEYS = ["product_categories", "use_cases", "demographics", "seasonal"]
 
+@plan_cache.file_cached(version=1)
 def read_yaml(path: str) -> Dict:
     if not os.path.exists(path):
         raise FileNotFoundError(f"Config not found: {path}")
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {}
 
+@plan_cache.file_cached(version=1)
 def read_terms_csv(path: str) -> Set[str]:
     if not os.path.exists(path):
         return set()
@@ -28,32 +39,44 @@ def read_terms_csv(path: str) -> Set[str]:
 def norm(s: str) -> str:
     return " ".join(str(s).lower().strip().split()).strip(".,;:-")
 
-def expand(seeds: List[str], heads: List[str], quals: List[str], tails: List[str]) -> List[str]:
-    cand: List[str] = []
+def iter_expand(seeds: List[str], heads: List[str], quals: List[str], tails: List[str]) -> Iterator[str]:
+    """Seed expansions (seed, head+seed, seed+qualifier, seed+tail), normalized and de-duplicated as they are generated."""
+    seen: Set[str] = set()
     for seed in seeds:
-        s = norm(seed)
-        if s: cand.append(s)
-        cand += [norm(f"{h} {seed}") for h in heads]
-        cand += [norm(f"{seed} {q}") for q in quals]
-        cand += [norm(f"{seed} {t}") for t in tails]
-    out, seen = [], set()
-    for kw in cand:
-        if kw and kw not in seen:
-            seen.add(kw); out.append(kw)
-    return out
-
-def filter_kw(kws: List[str], negatives: Set[str], banned: Set[str], brand: Set[str], comp: Set[str]) -> List[str]:
-    blocked = negatives | banned | brand | comp
-    return [k for k in kws if not any(b in k for b in blocked)]
+        for kw in chain((seed,), (f"{h} {seed}" for h in heads), (f"{seed} {q}" for q in quals), (f"{seed} {t}" for t in tails)):
+            kw = norm(kw)
+            if kw and kw not in seen:
+                seen.add(kw); yield kw
+
+class BlockedMatcher:
+    """search(k) is true iff some blocked term is a substring of k. Terms are bucketed by length, so a keyword only
+    hashes its slices of lengths some term has, and terms longer than the keyword are never looked at; building is
+    one pass over the terms, linear in their total length. With a base matcher, base's terms are blocked too, so a
+    few extra terms extend a large matcher without rebuilding it."""
+    def __init__(self, terms: Iterable[str], base: Optional["BlockedMatcher"] = None):
+        by_len: Dict[int, Set[str]] = {}
+        for t in terms: by_len.setdefault(len(t), set()).add(t)
+        self.by_len: List[Tuple[int, FrozenSet[str]]] = [(n, frozenset(ts)) for n, ts in sorted(by_len.items())]
+        self.base = base
+
+    def search(self, k: str) -> bool:
+        if self.base is not None and self.base.search(k): return True
+        size = len(k)
+        for n, ts in self.by_len:
+            if n > size: break
+            if any(k[i:i + n] in ts for i in range(size - n + 1)): return True
+        return False
+
+@lru_cache(maxsize=8)
+def blocked_matcher(blocked: FrozenSet[str]) -> BlockedMatcher:
+    return BlockedMatcher(blocked)
 
 # -------- GKP (optional) --------
 def _san(h: str) -> str:
     return "".join(c.lower() if c.isalnum() else "_" for c in h).strip("_")
 
-def _num(v: Optional[str]) -> Optional[float]:
-    if v is None: return None
-    try: return float(str(v).replace(",","").strip())
-    except: return None
+def _num(v: Optional[str], scale: float = 1.0) -> Optional[float]:
+    return parse_num(v, scale)
 
 def _intval(v: Optional[str]) -> Optional[int]:
     f = _num(v); return int(f) if f is not None else None
@@ -62,44 +85,89 @@ def _comp_num(s: Optional[str]) -> float:
     m = (s or "").strip().lower()
     return 0.2 if m.startswith("l") else 0.8 if m.startswith("h") else 0.5
 
-def load_gkp(path: Optional[str]) -> Dict[str, Dict]:
-    p = path if path and os.path.exists(path) else None
-    if not p:
-        for name in os.listdir("."):
-            n = name.lower()
-            if n.endswith(".csv") and ("planner" in n or "gkp" in n):
-                p = name; break
-    if not p or not os.path.exists(p): return {}
-    data: Dict[str, Dict] = {}
+def find_gkp(path: Optional[str]) -> Optional[str]:
+    if path and os.path.exists(path): return path
+    for name in os.listdir("."):
+        n = name.lower()
+        if n.endswith(".csv") and ("planner" in n or "gkp" in n): return name
+    return None
+
+# Planner metrics live in one record array sorted by a 64-bit keyword hash, so lookups are a batched
+# searchsorted and the array can be memory-mapped straight from the cache instead of rebuilt per run.
+GKP_DTYPE = np.dtype([("h", "<u8"), ("vol", "<i8"), ("low", "<f8"), ("high", "<f8"), ("comp", "<f8")])
+GKP_INDEX_VERSION = 1
+
+def kw_hash(kw: str) -> int:
+    return int.from_bytes(hashlib.blake2b(kw.encode("utf-8"), digest_size=8).digest(), "little")
+
+class GkpIndex:
+    def __init__(self, rec: np.ndarray):
+        self.rec = rec
+
+    def __len__(self) -> int:
+        return len(self.rec)
+
+    def lookup(self, kws: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(found mask, record positions) for a batch of normalized keywords."""
+        h = np.fromiter((kw_hash(k) for k in kws), dtype="<u8", count=len(kws))
+        if not len(self.rec): return np.zeros(len(kws), dtype=bool), np.zeros(len(kws), dtype=np.intp)
+        pos = np.minimum(np.searchsorted(self.rec["h"], h), len(self.rec) - 1)
+        return self.rec["h"][pos] == h, pos
+
+def load_gkp(path: Optional[str]) -> Optional[GkpIndex]:
+    p = find_gkp(path)
+    return read_gkp(p) if p else None
+
+def read_gkp(p: str) -> GkpIndex:
+    key = plan_cache.make_key("gkp_index", GKP_INDEX_VERSION, plan_cache.file_digest(p)) if plan_cache.ENABLED else None
+    rec = plan_cache.load_array(key) if key else None
+    if rec is None:
+        rec = parse_gkp(p)
+        if key: plan_cache.store_array(key, rec)
+    return GkpIndex(rec)
+
+def parse_gkp(p: str) -> np.ndarray:
+    cols_out = (array("Q"), array("q"), array("d"), array("d"), array("d"))
     with open(p, "r", encoding="utf-8", errors="ignore") as f:
         rdr = csv.DictReader(f)
         cols = {_san(h): h for h in (rdr.fieldnames or [])}
         ck = cols.get("keyword") or cols.get("search_term") or cols.get("keyword_text") or next(iter(cols.values()), None)
         cv = cols.get("avg_monthly_searches") or cols.get("average_monthly_searches")
-        cl = cols.get("top_of_page_bid_low_range") or cols.get("low_top_of_page_bid")
-        ch = cols.get("top_of_page_bid_high_range") or cols.get("high_top_of_page_bid")
+        cl = cols.get("top_of_page_bid_low_range") or cols.get("low_top_of_page_bid") or cols.get("top_of_page_bid_low_micros")
+        ch = cols.get("top_of_page_bid_high_range") or cols.get("high_top_of_page_bid") or cols.get("top_of_page_bid_high_micros")
+        ls, hs = scale_for(_san(cl or "")), scale_for(_san(ch or ""))
         cc = cols.get("competition") or cols.get("competition_indexed_value")
-        if not ck or not cv: return {}
+        if not ck or not cv: return np.empty(0, GKP_DTYPE)
         for r in rdr:
             kw = norm(r.get(ck,""))
             if not kw: continue
-            vol = _intval(r.get(cv)) or 0
-            low = _num(r.get(cl)) or 0.0
-            high = _num(r.get(ch)) or 0.0
-            comp = _comp_num(r.get(cc))
-            data[kw] = {"vol": vol, "low": low, "high": high, "comp": comp}
-    return data
-
-def gkp_rank(cands: List[str], gkp: Dict[str, Dict], min_vol: int) -> List[str]:
-    scored = []
-    for kw in cands:
-        m = gkp.get(kw)
-        if not m or m["vol"] < min_vol: continue
-        mid = (m["low"]+m["high"])/2 if (m["low"] and m["high"]) else (m["low"] or m["high"] or 0.1)
-        score = math.log10(max(1,m["vol"])+1) * mid * (1.1 - m["comp"])
-        scored.append((score, kw))
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [k for _,k in scored]
+            for col, v in zip(cols_out, (kw_hash(kw), _intval(r.get(cv)) or 0, _num(r.get(cl), ls) or 0.0, _num(r.get(ch), hs) or 0.0, _comp_num(r.get(cc)))):
+                col.append(v)
+    rec = np.empty(len(cols_out[0]), GKP_DTYPE)
+    for name, col in zip(GKP_DTYPE.names, cols_out): rec[name] = np.frombuffer(col, dtype=GKP_DTYPE[name]) if len(col) else []
+    # a repeated keyword keeps its last row; np.unique also leaves the records sorted by hash
+    rev = rec[::-1]; _, first = np.unique(rev["h"], return_index=True)
+    return rev[first]
+
+def _top_k(score: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Positions of the k highest scores, highest first, ties in input order (a stable full sort, then [:k])."""
+    idx = np.arange(len(score))
+    if k is not None:
+        if k <= 0: return idx[:0]
+        if k < len(score):
+            thr = np.partition(score, len(score) - k)[len(score) - k]
+            idx = np.flatnonzero(score >= thr)
+    return idx[np.lexsort((idx, -score[idx]))][:k]
+
+def gkp_rank(cands: List[str], gkp: GkpIndex, min_vol: int, limit: Optional[int] = None) -> List[str]:
+    if not cands or not gkp: return []
+    found, pos = gkp.lookup(cands)
+    sel = np.flatnonzero(found); r = gkp.rec[pos[sel]]
+    keep = r["vol"] >= min_vol; sel, r = sel[keep], r[keep]
+    low, high = r["low"], r["high"]
+    mid = np.where((low != 0) & (high != 0), (low + high) / 2, np.where(low != 0, low, np.where(high != 0, high, 0.1)))
+    score = np.log10(np.maximum(1, r["vol"]) + 1) * mid * (1.1 - r["comp"])
+    return [cands[i] for i in sel[_top_k(score, limit)]]
 # -------- end GKP --------
 
 def write_keywords(rows: List[Tuple[str,str,str,str,str,str]], out_dir: str) -> str:
@@ -115,38 +183,96 @@ def write_assets(groups: Dict[str, Dict], out_dir: str) -> str:
     with open(path, "w", encoding="utf-8") as f: json.dump(groups, f, indent=2, ensure_ascii=False)
     return path
 
+# Per-theme inputs shared by every theme: modifiers, blocked-term matcher, GKP index and generation settings.
+# Pool workers read it from _CTX (inherited on fork, otherwise handed over once by the pool initializer).
+_CTX: Dict = {}
+
+def _init_worker(ctx: Dict) -> None:
+    _CTX.update(ctx)
+
+def build_theme(ttype: str, item: Dict, ctx: Dict) -> Optional[Tuple[List[Tuple[str,str,str,str,str,str]], str, Dict]]:
+    """keywords.csv rows, name and asset group for one theme; None when it has no name or seeds."""
+    name = (item.get("name") or "").strip(); url = (item.get("landing_url") or "").strip(); prio = str(item.get("priority","medium")).lower()
+    seeds = [norm(s) for s in (item.get("seeds") or []) if str(s).strip()]
+    if not name or not seeds: return None
+    blocked, gkp, limit = ctx["blocked"], ctx["gkp"], ctx["limit"]
+    cand = (k for k in iter_expand(seeds, ctx["heads"], ctx["quals"], ctx["tails"]) if not blocked.search(k))
+    if gkp:
+        cand = list(cand); top = gkp_rank(cand, gkp, ctx["min_vol"], limit) or cand[:limit]
+    else: top = list(islice(cand, limit))
+    rows = [(ttype, name, kw, mt, url, prio) for kw in top for mt in ctx["match_types"]]
+    return rows, name, {"theme_type": ttype, "landing_url": url, "priority": prio, "audience_signals": list(dict.fromkeys(seeds + top[:10]))}
+
+def _theme_job(job: Tuple[str, Dict]) -> Optional[Tuple[List[Tuple[str,str,str,str,str,str]], str, Dict]]:
+    return build_theme(job[0], job[1], _CTX)
+
+def run_themes(themes: List[Tuple[str, Dict]], ctx: Dict, workers: int = 1) -> Iterator:
+    """build_theme results in config order, computed serially or across a process pool."""
+    if workers <= 1 or len(themes) < 2:
+        return (build_theme(t, it, ctx) for t, it in themes)
+    if "fork" in multiprocessing.get_all_start_methods():
+        _CTX.clear(); _CTX.update(ctx); pool = dict(mp_context=multiprocessing.get_context("fork"))
+    else: pool = dict(initializer=_init_worker, initargs=(ctx,))
+    workers = min(workers, len(themes))
+    with ProcessPoolExecutor(max_workers=workers, **pool) as ex:
+        return iter(list(ex.map(_theme_job, themes, chunksize=max(1, len(themes) // (workers * 4)))))
+
 def main() -> None:
     ap = argparse.ArgumentParser("Deliverable 2 – PMax themes (optional GKP filter)")
     ap.add_argument("--config", default="configs/d2.yaml"); ap.add_argument("--out", default="deliverables/2")
+    ap.add_argument("--no-cache", action="store_true", help="reparse inputs instead of using the on-disk parse cache")
+    ap.add_argument("--workers", type=int, default=1, help="build themes across N processes (output is identical to a serial run)")
+    plan_profile.add_arguments(ap)
     args = ap.parse_args()
+    if args.no_cache: plan_cache.configure(enabled=False)
+    with plan_profile.profiling("deliverable2", args.profile, args.profile_out, args.cprofile): build(args.config, args.out, args.workers)
 
-    cfg = read_yaml(args.config)
+def blocked_terms(cfg: Dict) -> FrozenSet[str]:
+    """Negatives, banned terms, brand terms (config and brand_keywords.csv) and competitor_keywords.csv terms."""
     mods = cfg.get("modifiers", {}) or {}
-    heads = [norm(x) for x in mods.get("heads",[])]; quals = [norm(x) for x in mods.get("qualifiers",[])]; tails = [norm(x) for x in mods.get("long_tail",[])]
     negatives = {norm(x) for x in mods.get("negatives",[])}; brand = {norm(x) for x in mods.get("brand_terms",[])} | read_terms_csv("brand_keywords.csv")
     banned = {norm(x) for x in mods.get("banned_terms",[])}; comp_terms = read_terms_csv("competitor_keywords.csv")
+    return frozenset(negatives | banned | brand | comp_terms)
+
+def theme_context(cfg: Dict, blocked: Optional[BlockedMatcher] = None) -> Dict:
+    """Everything build_theme needs besides the theme itself: modifiers, blocked-term matcher, GKP index, limits.
+    blocked, if given, is used as the matcher for cfg's blocked_terms instead of building one."""
+    mods = cfg.get("modifiers", {}) or {}
+    heads = [norm(x) for x in mods.get("heads",[])]; quals = [norm(x) for x in mods.get("qualifiers",[])]; tails = [norm(x) for x in mods.get("long_tail",[])]
     gen = cfg.get("generation",{}) or {}; match_types = gen.get("match_types",["exact","phrase"]); limit = int(gen.get("max_keywords_per_theme",120))
-    gkp_cfg = cfg.get("gkp",{}) or {}; gkp_data = load_gkp(gkp_cfg.get("csv_path")) if gkp_cfg.get("enabled", True) else {}; min_vol = int(gkp_cfg.get("min_volume", 500))
+    gkp_cfg = cfg.get("gkp",{}) or {}; min_vol = int(gkp_cfg.get("min_volume", 500))
+    with plan_profile.stage("load_gkp"): gkp_data = load_gkp(gkp_cfg.get("csv_path")) if gkp_cfg.get("enabled", True) else None
+
+    if blocked is None:
+        with plan_profile.stage("blocked_matcher"): blocked = blocked_matcher(blocked_terms(cfg))
+    return {"heads": heads, "quals": quals, "tails": tails, "blocked": blocked, "gkp": gkp_data, "min_vol": min_vol, "limit": limit, "match_types": match_types}
 
+def collect_themes(cfg: Dict) -> List[Tuple[str, Dict]]:
     themes = []
     for t in THEME_KEYS:
         for it in (cfg.get("themes",{}).get(t,[]) or []):
             if not isinstance(it, dict): it = {"name": str(it), "seeds": [str(it)]}
             themes.append((t, it))
-    if not themes: raise SystemExit("No themes found in config.")
+    return themes
 
+def merge_themes(results: Iterable) -> Tuple[List[Tuple[str,str,str,str,str,str]], Dict[str, Dict]]:
     rows: List[Tuple[str,str,str,str,str,str]] = []; groups: Dict[str, Dict] = {}
-    for ttype, item in themes:
-        name = (item.get("name") or "").strip(); url = (item.get("landing_url") or "").strip(); prio = str(item.get("priority","medium")).lower()
-        seeds = [norm(s) for s in (item.get("seeds") or []) if str(s).strip()]
-        if not name or not seeds: continue
-        cand = filter_kw(expand(seeds, heads, quals, tails), negatives, banned, brand, comp_terms)
-        top = (gkp_rank(cand, gkp_data, min_vol) or cand)[:limit] if gkp_data else cand[:limit]
-        for kw in top:
-            for mt in match_types: rows.append((ttype, name, kw, mt, url, prio))
-        groups[name] = {"theme_type": ttype, "landing_url": url, "priority": prio, "audience_signals": list(dict.fromkeys(seeds + top[:10]))}
-
-    print("Wrote:", write_keywords(rows, args.out)); print("Wrote:", write_assets(groups, args.out))
+    for res in results:
+        if res is None: continue
+        theme_rows, name, group = res
+        rows += theme_rows; groups[name] = group
+    return rows, groups
+
+def build(config: str, out_dir: str, workers: int = 1) -> None:
+    with plan_profile.stage("read_yaml"): cfg = read_yaml(config)
+    ctx = theme_context(cfg)
+    themes = collect_themes(cfg)
+    if not themes: raise SystemExit("No themes found in config.")
+
+    with plan_profile.stage(f"themes ({len(themes)})"): rows, groups = merge_themes(run_themes(themes, ctx, workers))
+
+    with plan_profile.stage("write keywords.csv"): print("Wrote:", write_keywords(rows, out_dir))
+    with plan_profile.stage("write asset_groups.json"): print("Wrote:", write_assets(groups, out_dir))
 
 if __name__ == "__main__":
     main()
@@ -1,45 +1,133 @@
-﻿import argparse, csv, os
-from typing import Dict, List, Tuple
+﻿import argparse, csv, io, itertools, os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import plan_cache, plan_profile
+
 try:
     import yaml
 except ImportError:
     raise SystemExit("PyYAML not installed. Run: pip install PyYAML")
 
-FACTORS: Dict[str, float] = {"low": 0.85, "medium": 1.00, "high": 1.30}
-
+@plan_cache.file_cached(version=1)
 def read_yaml(path: str) -> Dict:
     if not os.path.exists(path): raise FileNotFoundError(f"Config not found: {path}")
     with open(path, "r", encoding="utf-8") as f: return yaml.safe_load(f) or {}
 
-def clamp(x: float, lo: float, hi: float) -> float: return max(lo, min(hi, x))
+FACTORS: Dict[str, float] = {"low": 0.85, "medium": 1.00, "high": 1.30}
+NOTES = np.array(["Monitor", "Constrained", "Increase budget"])
+SWEEP_PARAMS = ("target_roas", "cvr", "aov", "budget_scale")
+
+def clamp(x, lo, hi): return np.maximum(lo, np.minimum(hi, x))
 def fmt(x: float) -> str: return f"{x:.2f}"
 
+def _per_click(budget, cpc): return np.where(cpc > 0, budget / np.where(cpc > 0, cpc, 1.0), 0.0)
+
+def simulate(low, high, cf, budget, cvr, aov, troas, tcpa) -> Dict[str, np.ndarray]:
+    """Bid formula over broadcast arrays, e.g. product groups (P,) against scenario columns (S, 1).
+    The suggested CPC is retried at prelim*1.15 when it buys fewer than 30 clicks and sits below the high bid."""
+    tcpc = tcpa * cvr; prelim = tcpc * cf; sugg = clamp(prelim, low, high); clicks = _per_click(budget, sugg)
+    retry = (clicks < 30) & (sugg < high)
+    sugg = np.where(retry, clamp(prelim * 1.15, low, high), sugg); clicks = np.where(retry, _per_click(budget, sugg), clicks)
+    conv = clicks * cvr; spend = clicks * sugg; rev = conv * aov
+    roas = np.where(spend > 0, rev / np.where(spend > 0, spend, 1.0), 0.0)
+    note = NOTES[np.select([(roas >= troas) & (clicks >= 30), clicks < 30], [2, 1], 0)]
+    return {"tcpc": tcpc, "prelim": prelim, "sugg": sugg, "clicks": clicks, "conv": conv, "roas": roas, "note": note}
+
+def _targets(g: Dict) -> Tuple[float, float, float, Optional[float]]:
+    return float(g.get("cvr", 0.02)), float(g.get("aov", 45.0)), float(g.get("target_roas", 3.0)), (float(g["target_cpa"]) if "target_cpa" in g else None)
+
+def product_groups(cfg: Dict) -> Dict[str, np.ndarray]:
+    items = cfg.get("shopping_bids", []) or []
+    comps = [str(it.get("competition","Medium")).strip().lower() for it in items]
+    return {"name": np.array([str(it.get("product_group","")).strip() for it in items], dtype=object), "comp": np.array(comps, dtype=object),
+            "low": np.array([float(it.get("top_of_page_low",0)) for it in items]), "high": np.array([float(it.get("top_of_page_high",0)) for it in items]),
+            "budget": np.array([float(it.get("daily_budget",0)) for it in items]), "cf": np.array([FACTORS.get(c,1.0) for c in comps])}
+
 def compute_rows(cfg: Dict) -> List[Tuple]:
-    g = cfg.get("global", {}) or {}
-    cvr = float(g.get("cvr", 0.02)); aov = float(g.get("aov", 45.0)); troas = float(g.get("target_roas", 3.0))
-    tcpa = float(g.get("target_cpa", aov / troas)); tcpc = tcpa * cvr
-    rows: List[Tuple] = []
-    for it in cfg.get("shopping_bids", []) or []:
-        name = str(it.get("product_group","")).strip(); low = float(it.get("top_of_page_low",0)); high = float(it.get("top_of_page_high",0))
-        comp = str(it.get("competition","Medium")).strip().lower(); budget = float(it.get("daily_budget",0))
-        cf = FACTORS.get(comp,1.0); prelim = tcpc*cf; sugg = clamp(prelim,low,high)
-        clicks = (budget/sugg) if sugg>0 else 0.0
-        if clicks<30 and sugg<high: sugg = clamp(prelim*1.15, low, high); clicks = (budget/sugg) if sugg>0 else 0.0
-        conv = clicks*cvr; spend = clicks*sugg; rev = conv*aov; roas = (rev/spend) if spend>0 else 0.0
-        note = "Increase budget" if roas>=troas and clicks>=30 else ("Constrained" if clicks<30 else "Monitor")
-        rows.append((name,low,high,comp.capitalize(),budget,cvr,aov,troas,tcpa,tcpc,cf,prelim,sugg,clicks,conv,roas,note))
+    cvr, aov, troas, tcpa = _targets(cfg.get("global", {}) or {})
+    if tcpa is None: tcpa = aov / troas
+    pg = product_groups(cfg); r = simulate(pg["low"], pg["high"], pg["cf"], pg["budget"], cvr, aov, troas, tcpa)
+    rows: List[Tuple] = list(zip(pg["name"], pg["low"].tolist(), pg["high"].tolist(), [c.capitalize() for c in pg["comp"]], pg["budget"].tolist(),
+                                 itertools.repeat(cvr), itertools.repeat(aov), itertools.repeat(troas), itertools.repeat(tcpa), itertools.repeat(float(r["tcpc"])),
+                                 pg["cf"].tolist(), r["prelim"].tolist(), r["sugg"].tolist(), r["clicks"].tolist(), r["conv"].tolist(), r["roas"].tolist(), r["note"].tolist()))
     rows.sort(key=lambda r: (r[15], r[13]), reverse=True); return rows
 
+def sweep_values(spec, default: float) -> np.ndarray:
+    """A sweep axis from YAML: a number, a list, or {start, stop, step} / {start, stop, num} (stop inclusive)."""
+    if spec is None: return np.array([default])
+    if isinstance(spec, dict):
+        start, stop = float(spec["start"]), float(spec["stop"])
+        if "num" in spec:
+            if int(spec["num"]) < 1: raise ValueError(f"sweep num must be at least 1: {spec}")
+            return np.linspace(start, stop, int(spec["num"]))
+        step = float(spec.get("step", 1.0))
+        if step <= 0: raise ValueError(f"sweep step must be positive: {spec}")
+        if stop < start: raise ValueError(f"sweep stop must not be below start when stepping: {spec}")
+        return start + step * np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1)
+    if isinstance(spec, (list, tuple)):
+        if not spec: raise ValueError("sweep list must not be empty")
+        return np.array([float(v) for v in spec])
+    return np.array([float(spec)])
+
+def sweep(cfg: Dict) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """(scenario grid, product groups, results shaped scenarios x product groups) for the config's sweep: section."""
+    cvr, aov, troas, tcpa = _targets(cfg.get("global", {}) or {})
+    sw = cfg.get("sweep", {}) or {}
+    unknown = set(sw) - set(SWEEP_PARAMS)
+    if unknown: raise SystemExit(f"Unknown sweep parameters: {', '.join(sorted(unknown))} (expected {', '.join(SWEEP_PARAMS)})")
+    axes = [sweep_values(sw.get(k), d) for k, d in zip(SWEEP_PARAMS, (troas, cvr, aov, 1.0))]
+    grid = {k: v.ravel() for k, v in zip(SWEEP_PARAMS, np.meshgrid(*axes, indexing="ij"))}
+    col = {k: v[:, None] for k, v in grid.items()}
+    pg = product_groups(cfg)
+    cpa = col["aov"] / col["target_roas"] if tcpa is None else np.full_like(col["aov"], tcpa)
+    res = simulate(pg["low"], pg["high"], pg["cf"], pg["budget"] * col["budget_scale"], col["cvr"], col["aov"], col["target_roas"], cpa)
+    res["budget"] = pg["budget"] * col["budget_scale"]; res["tcpa"] = cpa
+    return grid, pg, res
+
+def _csv_line(cells: List) -> str:
+    buf = io.StringIO(); csv.writer(buf, lineterminator="").writerow(cells); return buf.getvalue()
+
+def write_sweep(grid: Dict[str, np.ndarray], pg: Dict[str, np.ndarray], res: Dict[str, np.ndarray], out_dir: str) -> str:
+    """Long format: one row per scenario x product group, scenarios in grid order, product groups in config order."""
+    os.makedirs(out_dir, exist_ok=True); dest = os.path.join(out_dir, "bid_sweep.csv")
+    hdr = ["scenario","target_roas","cvr","aov","budget_scale","product_group","competition","daily_budget","target_cpa","target_cpc","suggested_cpc","clicks_per_day","expected_conversions","expected_roas","notes"]
+    S, P = res["sugg"].shape
+    # scenario and product-group cells are formatted once; each row then only formats its own numbers
+    scen = [f"{i},{r:.2f},{c:.4f},{a:.2f},{b:.4f}" for i, (r, c, a, b) in enumerate(zip(*(grid[k].tolist() for k in SWEEP_PARAMS)))]
+    groups = [_csv_line([n, c.capitalize()]) for n, c in zip(pg["name"], pg["comp"])]
+    mats = [np.broadcast_to(res[k], (S, P)) for k in ("budget", "tcpa", "tcpc", "sugg", "clicks", "conv", "roas", "note")]
+    line = "%s,%s" + ",%.2f" * 7 + ",%s\r\n"
+    with open(dest, "w", encoding="utf-8", newline="") as f:
+        f.write(_csv_line(hdr) + "\r\n")
+        for i in range(S):
+            f.write("".join([line % r for r in zip(itertools.repeat(scen[i]), groups, *(m[i].tolist() for m in mats))]))
+    return dest
+
+BID_COLS = ["product_group","top_of_page_low","top_of_page_high","competition","daily_budget","cvr","aov","target_roas","target_cpa","target_cpc","comp_factor","prelim_cpc","suggested_cpc","clicks_per_day","expected_conversions","expected_roas","notes"]
+
 def write_csv(rows: List[Tuple], out_dir: str) -> str:
     os.makedirs(out_dir, exist_ok=True); dest = os.path.join(out_dir, "bids.csv")
-    hdr = ["product_group","top_of_page_low","top_of_page_high","competition","daily_budget","cvr","aov","target_roas","target_cpa","target_cpc","comp_factor","prelim_cpc","suggested_cpc","clicks_per_day","expected_conversions","expected_roas","notes"]
     with open(dest, "w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f); w.writerow(hdr)
+        w = csv.writer(f); w.writerow(BID_COLS)
         for r in rows: w.writerow([r[0],fmt(r[1]),fmt(r[2]),r[3],fmt(r[4]),fmt(r[5]),fmt(r[6]),fmt(r[7]),fmt(r[8]),fmt(r[9]),fmt(r[10]),fmt(r[11]),fmt(r[12]),fmt(r[13]),fmt(r[14]),fmt(r[15]),r[16]])
     return dest
 
 def main() -> None:
     ap = argparse.ArgumentParser("Deliverable 3 – Suggested CPC Bids")
     ap.add_argument("--config", default="configs/d3.yaml"); ap.add_argument("--out", default="deliverables/3")
-    args = ap.parse_args(); rows = compute_rows(read_yaml(args.config)); print("Wrote:", write_csv(rows, args.out))
+    ap.add_argument("--no-cache", action="store_true", help="reparse inputs instead of using the on-disk parse cache")
+    ap.add_argument("--sweep", action="store_true", help="evaluate the config's sweep: grid and write bid_sweep.csv")
+    plan_profile.add_arguments(ap)
+    args = ap.parse_args()
+    if args.no_cache: plan_cache.configure(enabled=False)
+    with plan_profile.profiling("deliverable3", args.profile, args.profile_out, args.cprofile):
+        with plan_profile.stage("read_yaml"): cfg = read_yaml(args.config)
+        if args.sweep:
+            with plan_profile.stage("sweep"): res = sweep(cfg)
+            with plan_profile.stage("write bid_sweep.csv"): print("Wrote:", write_sweep(*res, args.out))
+        else:
+            with plan_profile.stage("compute_rows"): rows = compute_rows(cfg)
+            with plan_profile.stage("write bids.csv"): print("Wrote:", write_csv(rows, args.out))
 if __name__ == "__main__": main()
@@ -0,0 +1,50 @@
+import re
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# GKP numeric cells: "₹1,234.50", "Rs. 12", "12 INR", "1K – 10K", "--". Currency markers and thousands
+# separators are dropped, K/M/B suffixes scale, a range resolves to its midpoint, anything else is missing.
+_STRIP_RX = re.compile(r"₹|rs\.?|inr|,")
+_NUM = r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?"
+_NUM_RX = re.compile(rf"^(?P<a>{_NUM})\s*(?P<ak>[kmb]?)(?:\s*(?:-|–|—|to)\s*(?P<b>{_NUM})\s*(?P<bk>[kmb]?))?$")
+_MULT = {"": 1.0, "k": 1e3, "m": 1e6, "b": 1e9}
+
+def scale_for(col: Optional[str]) -> float:
+    return 1e-6 if col and col.endswith("_micros") else 1.0
+
+def _missing(v) -> bool:
+    # None, NaN (float or numpy) and pandas' NA, tested by type so that parse_num callers need not import pandas
+    return v is None or (isinstance(v, float) and v != v) or type(v).__name__ == "NAType"
+
+def _parse_stripped(t: str) -> Optional[float]:
+    m = _NUM_RX.match(t)
+    if not m: return None
+    a = float(m["a"]) * _MULT[m["ak"]]
+    return a if m["b"] is None else (a + float(m["b"]) * _MULT[m["bk"]]) / 2
+
+def parse_num(v, scale: float = 1.0) -> Optional[float]:
+    if _missing(v): return None
+    if isinstance(v, (int, float)): return float(v) * scale
+    x = _parse_stripped(_STRIP_RX.sub("", str(v).lower()).strip())
+    return None if x is None else x * scale
+
+def to_num_series(s: "pd.Series", scale: float = 1.0) -> "pd.Series":
+    """Column-wise parse_num. One regex pass over the joined column strips currency markers and separators; the cells
+    left as plain unsigned decimals (nearly all of a GKP export) convert with float() in one C-level map, and only the
+    rest (ranges, K/M/B suffixes, signs, exponents, "--") go through _NUM_RX. Missing -> NaN."""
+    import numpy as np
+    import pandas as pd
+    if pd.api.types.is_float_dtype(s) or pd.api.types.is_integer_dtype(s): return s.astype(float) * scale
+    cells = s.where(s.notna(), "").astype(str).tolist()
+    # _STRIP_RX only matches literals without "\n", so one pass over the joined cells equals one pass per cell
+    t = _STRIP_RX.sub("", "\n".join(cells).lower()).split("\n")
+    if len(t) != len(cells): t = [_STRIP_RX.sub("", x.lower()) for x in cells]  # some cell spans lines
+    t = np.array([x.strip() for x in t], dtype=object)
+    # unsigned decimals with at most one point: float() reads these exactly as _NUM_RX would
+    plain = np.array([x.replace(".", "", 1).isdecimal() for x in t], dtype=bool)
+    out = np.full(len(t), np.nan); out[plain] = np.fromiter(map(float, t[plain]), float, int(plain.sum()))
+    rest = np.flatnonzero(~plain & (t != ""))
+    out[rest] = [np.nan if x is None else x for x in map(_parse_stripped, t[rest])]
+    return pd.Series(out, index=s.index) * scale
@@ -0,0 +1,111 @@
+import functools, hashlib, io, json, os, pickle, tempfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Parsed inputs and pipeline stage results are pickled (numpy arrays: .npy) under CACHE_DIR. Parser entries are keyed by the input
+# file's content hash plus parser name, version and call arguments; stage entries by their caller's key (make_key).
+# Entries are evicted least-recently-used once the directory exceeds MAX_BYTES.
+CACHE_DIR = os.environ.get("SEM_CACHE_DIR", os.path.join(".cache", "sem_inputs"))
+MAX_BYTES = int(float(os.environ.get("SEM_CACHE_MAX_MB", "1024")) * 2**20)
+ENABLED = True
+
+def configure(enabled: Optional[bool] = None, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+    global ENABLED, CACHE_DIR, MAX_BYTES
+    if enabled is not None: ENABLED = enabled
+    if cache_dir: CACHE_DIR = cache_dir
+    if max_bytes is not None: MAX_BYTES = max_bytes
+
+def _atomic_write(path: str, data: bytes) -> None:
+    d = os.path.dirname(path); os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f: f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+def file_digest(path: str) -> str:
+    """sha256 of the file bytes; remembered per (path, size, mtime) so unchanged files are not re-read. The memo is kept
+    in process and, only while the cache is enabled, under CACHE_DIR/digests so later runs share it."""
+    st = os.stat(path); ident = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if ident in _DIGESTS: return _DIGESTS[ident]
+    memo = os.path.join(CACHE_DIR, "digests", hashlib.sha1(ident[0].encode()).hexdigest() + ".json")
+    if ENABLED:
+        try:
+            with open(memo, "r", encoding="utf-8") as f: m = json.load(f)
+            if m["size"] == st.st_size and m["mtime_ns"] == st.st_mtime_ns: _DIGESTS[ident] = m["digest"]; return m["digest"]
+        except (OSError, ValueError, KeyError): pass
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    _DIGESTS[ident] = h.hexdigest()
+    if ENABLED:
+        try: _atomic_write(memo, json.dumps({"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": h.hexdigest()}).encode())
+        except OSError: pass
+    return h.hexdigest()
+
+def _evict() -> None:
+    entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(CACHE_DIR) if e.name.endswith((".pkl", ".npy"))]
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_BYTES: break
+        try: os.remove(path)
+        except OSError: pass
+        total -= size
+
+def load(key: str) -> Tuple[bool, Any]:
+    """(hit, value) for a cache key; unreadable entries are dropped and count as a miss."""
+    if not ENABLED: return False, None
+    entry = os.path.join(CACHE_DIR, key + ".pkl")
+    try:
+        with open(entry, "rb") as f: val = pickle.load(f)
+        os.utime(entry); return True, val
+    except FileNotFoundError: return False, None
+    except Exception:
+        try: os.remove(entry)
+        except OSError: pass
+        return False, None
+
+def store(key: str, val: Any) -> None:
+    if not ENABLED: return
+    try: _atomic_write(os.path.join(CACHE_DIR, key + ".pkl"), pickle.dumps(val, protocol=pickle.HIGHEST_PROTOCOL)); _evict()
+    except OSError: pass
+
+def load_array(key: str) -> Any:
+    """A stored numpy array, memory-mapped read-only, or None on a miss."""
+    if not ENABLED: return None
+    import numpy as np
+    entry = os.path.join(CACHE_DIR, key + ".npy")
+    try: arr = np.load(entry, mmap_mode="r")
+    except FileNotFoundError: return None
+    except Exception:
+        try: os.remove(entry)
+        except OSError: pass
+        return None
+    os.utime(entry); return arr
+
+def store_array(key: str, arr: Any) -> None:
+    if not ENABLED: return
+    import numpy as np
+    buf = io.BytesIO(); np.save(buf, arr, allow_pickle=False)
+    try: _atomic_write(os.path.join(CACHE_DIR, key + ".npy"), buf.getvalue()); _evict()
+    except OSError: pass
+
+def make_key(*parts: Any) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def file_cached(version: int) -> Callable:
+    """Memoize a parser fn(path, *args) on disk. Bump version whenever the parser's output changes."""
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(path, *args, **kwargs) -> Any:
+            if not ENABLED or not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path): return fn(path, *args, **kwargs)
+            key = make_key(fn.__qualname__, version, file_digest(path), args, sorted(kwargs.items()))
+            hit, val = load(key)
+            if not hit:
+                val = fn(path, *args, **kwargs); store(key, val)
+            return val
+        return wrapper
+    return deco
@@ -0,0 +1,84 @@
+import argparse, contextlib, cProfile, json, os, sys, time, tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: no RSS high-water mark
+    resource = None
+
+# Stage timing and memory for the builders' --profile flag. Off by default, where stage() only yields, so the
+# instrumentation stays in place at no cost. Under session() each stage records wall time, net and peak traced
+# Python allocations (tracemalloc) and the process RSS high-water mark; nested stages nest in the table and trace.
+ENABLED = False
+RECORDS: List[Dict] = []
+_open: List[Dict] = []
+_t0 = 0.0
+
+def _mb(n: float) -> float: return round(n / 2**20, 3)
+
+def _rss_mb() -> Optional[float]:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return _mb(peak if sys.platform == "darwin" else peak * 1024)
+
+@contextlib.contextmanager
+def stage(name: str, status: str = "ran") -> Iterator[None]:
+    if not ENABLED:
+        yield; return
+    cur, peak = tracemalloc.get_traced_memory()
+    if _open: _open[-1]["_peak"] = max(_open[-1]["_peak"], peak)
+    tracemalloc.reset_peak()
+    rec = {"stage": name, "status": status, "depth": len(_open), "start": round(time.perf_counter() - _t0, 6), "_cur": cur, "_peak": cur}
+    RECORDS.append(rec); _open.append(rec); t = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        rec["status"] = "failed"; raise
+    finally:
+        secs = time.perf_counter() - t; end, peak = tracemalloc.get_traced_memory(); _open.pop()
+        peak = max(rec.pop("_peak"), peak); start = rec.pop("_cur")
+        if _open: _open[-1]["_peak"] = max(_open[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+        rec.update(seconds=round(secs, 6), alloc_mb=_mb(end - start), peak_mb=_mb(peak), rss_mb=_rss_mb())
+
+def record(name: str, status: str, seconds: float) -> None:
+    """A stage that was not run here (e.g. restored from cache): time only."""
+    if ENABLED: RECORDS.append({"stage": name, "status": status, "depth": len(_open), "start": round(time.perf_counter() - _t0, 6),
+                                "seconds": round(seconds, 6), "alloc_mb": None, "peak_mb": None, "rss_mb": None})
+
+def print_table(records: List[Dict]) -> None:
+    w = max([len("stage")] + [2 * r["depth"] + len(r["stage"]) for r in records])
+    print(f"{'stage':<{w}} {'status':<7} {'ms':>10} {'alloc MB':>9} {'peak MB':>9} {'rss MB':>9}")
+    cell = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+    for r in records:
+        print(f"{'  ' * r['depth'] + r['stage']:<{w}} {r['status']:<7} {r['seconds'] * 1000:>10.1f} {cell(r['alloc_mb'])} {cell(r['peak_mb'])} {cell(r['rss_mb'])}")
+
+def write_trace(path: str, builder: str, records: List[Dict]) -> str:
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    trace = {"builder": builder, "argv": sys.argv, "python": sys.version.split()[0], "started": datetime.now(timezone.utc).isoformat(timespec="seconds"), "stages": records}
+    with open(path, "w", encoding="utf-8") as f: json.dump(trace, f, indent=2)
+    return path
+
+@contextlib.contextmanager
+def session(builder: str, trace_path: Optional[str] = None, cprofile_path: Optional[str] = None) -> Iterator[None]:
+    """Profile the enclosed run as stage "total"; afterwards print the table, write the JSON trace and the cProfile dump."""
+    global ENABLED, _t0
+    ENABLED = True; RECORDS.clear(); _t0 = time.perf_counter(); tracemalloc.start()
+    prof = cProfile.Profile() if cprofile_path else None
+    try:
+        if prof: prof.enable()
+        with stage("total"): yield
+    finally:
+        if prof: prof.disable(); prof.dump_stats(cprofile_path)
+        tracemalloc.stop(); ENABLED = False
+        print_table(RECORDS); print("Profile trace:", write_trace(trace_path or f"{builder}_profile.json", builder, RECORDS))
+        if prof: print("cProfile stats:", cprofile_path)
+
+def profiling(builder: str, enabled: bool, trace_path: Optional[str] = None, cprofile_path: Optional[str] = None):
+    return session(builder, trace_path, cprofile_path) if enabled or trace_path or cprofile_path else contextlib.nullcontext()
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--profile", action="store_true", help="print per-stage time and memory and write a JSON trace")
+    ap.add_argument("--profile-out", default=None, help="JSON trace path (default <builder>_profile.json; implies --profile)")
+    ap.add_argument("--cprofile", default=None, help="also dump cProfile stats to this path (implies --profile)")
@@ -0,0 +1,262 @@
+import argparse, asyncio, json, os, sys, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import build_deliverable1 as d1
+import build_deliverable2 as d2
+import build_deliverable3 as d3
+import plan_cache
+
+# Keeps the deliverable 1 stage results, the deliverable 2 theme context (GKP index, blocked-term matcher) and the
+# deliverable 3 config resident and answers what-if requests against them. A request carries config overrides
+# (budgets, filters, themes, bids, ...). Deliverable 1 reruns only the stages whose config slice changed, starting
+# from a copy of the resident result before them. Snapshots are never mutated (deliverable 2's cache of override
+# contexts is lock-guarded), so requests run concurrently on a thread pool, and "update"/"reload" swap in new snapshots.
+FORECAST_SHEETS = ["Summary", "Forecast_2pc_CVR", "Shopping_Structure", "PMax_Asset_Groups"]
+
+def merge(base: Dict, over: Optional[Dict]) -> Dict:
+    """Deep-merged copy: nested dicts merge, anything else (lists included) replaces."""
+    out = dict(base)
+    for k, v in (over or {}).items():
+        out[k] = merge(base[k], v) if isinstance(v, dict) and isinstance(base.get(k), dict) else v
+    return out
+
+def records(df: pd.DataFrame) -> List[Dict]:
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def _overrides(req: Dict, keys: Tuple[str, ...]) -> Dict:
+    return {k: req[k] for k in keys if k in req}
+
+class Plan1:
+    """Deliverable 1 snapshot: config, the state after each BUILD_STAGES stage and the final group index."""
+    def __init__(self, cfg: Dict, states: List[pd.DataFrame], idx: Optional[pd.DataFrame] = None):
+        self.cfg, self.states = cfg, states
+        self.idx = idx if idx is not None else d1.group_index(states[-1])
+
+    @classmethod
+    def load(cls, cfg: Dict) -> "Plan1":
+        if not plan_cache.ENABLED: return cls(cfg, replay(cfg, [], 0))
+        # every stage prefix resolves from the stage cache, so only stages missing from it run
+        return cls(cfg, [d1.run_stages(cfg, d1.BUILD_STAGES[:i + 1])[0] for i in range(len(d1.BUILD_STAGES))])
+
+    def first_changed(self, cfg: Dict) -> int:
+        for i, (_, deps, _) in enumerate(d1.BUILD_STAGES):
+            if any(d1._fingerprint(d1._cfg_part(cfg, d)) != d1._fingerprint(d1._cfg_part(self.cfg, d)) for d in deps): return i
+        return len(d1.BUILD_STAGES)
+
+    def derive(self, cfg: Dict) -> Tuple["Plan1", List[str]]:
+        """Snapshot for cfg and the stages that had to rerun."""
+        start = self.first_changed(cfg)
+        if start == len(self.states): return Plan1(cfg, self.states, self.idx), []
+        return Plan1(cfg, replay(cfg, self.states, start)), [name for name, _, _ in d1.BUILD_STAGES[start:]]
+
+def replay(cfg: Dict, states: List[pd.DataFrame], start: int) -> List[pd.DataFrame]:
+    """States for BUILD_STAGES[start:], each stage run on a copy of the previous state (stages modify their input)."""
+    out = list(states[:start]); state = out[-1] if out else None
+    for _, _, fn in d1.BUILD_STAGES[start:]:
+        state = fn(state.copy() if state is not None else None, cfg); out.append(state)
+    return out
+
+class Plan2:
+    """Deliverable 2 snapshot: config, its theme context, and the contexts of recent overrides (LRU, CONTEXTS entries)
+    keyed by the config slices they read. Overrides reuse the resident blocked-term matcher when their blocked terms
+    are the same and extend it when they only add terms."""
+    CONTEXTS = 16
+
+    def __init__(self, cfg: Dict):
+        self.cfg, self.terms = cfg, d2.blocked_terms(cfg)
+        self.resident = d2.theme_context(cfg)
+        self.lock = threading.Lock(); self._ctx: "OrderedDict[str, Dict]" = OrderedDict()
+
+    @staticmethod
+    def _key(cfg: Dict) -> str:
+        return json.dumps([cfg.get(k) for k in ("modifiers", "generation", "gkp")], sort_keys=True, default=str)
+
+    def matcher(self, cfg: Dict) -> d2.BlockedMatcher:
+        terms = d2.blocked_terms(cfg); base = self.resident["blocked"]
+        if terms == self.terms: return base
+        return d2.BlockedMatcher(terms - self.terms, base) if terms > self.terms else d2.blocked_matcher(terms)
+
+    def context(self, cfg: Dict) -> Dict:
+        key = self._key(cfg)
+        if key == self._key(self.cfg): return self.resident
+        with self.lock:
+            if key in self._ctx:
+                self._ctx.move_to_end(key); return self._ctx[key]
+        ctx = d2.theme_context(cfg, self.matcher(cfg))
+        with self.lock:
+            self._ctx[key] = ctx
+            while len(self._ctx) > self.CONTEXTS: self._ctx.popitem(last=False)
+        return ctx
+
+class PlanServer:
+    OPS = ("forecast", "themes", "bids", "sweep", "update", "reload", "status")
+
+    def __init__(self, d1_config: str, d2_config: str, d3_config: str):
+        self.paths = {"d1": d1_config, "d2": d2_config, "d3": d3_config}
+        self.lock = threading.Lock(); self.served = 0
+        self.reload()
+
+    def reload(self) -> Dict:
+        t = time.perf_counter()
+        p1 = Plan1.load(d1.load_cfg(self.paths["d1"]))
+        p2 = Plan2(d2.read_yaml(self.paths["d2"])) if os.path.exists(self.paths["d2"]) else None
+        p3 = d3.read_yaml(self.paths["d3"]) if os.path.exists(self.paths["d3"]) else None
+        with self.lock: self.p1, self.p2, self.p3 = p1, p2, p3
+        return {"seconds": round(time.perf_counter() - t, 3)}
+
+    def handle(self, req: Dict) -> Dict:
+        t = time.perf_counter(); op = req.get("op", "forecast")
+        res: Dict[str, Any] = {"id": req.get("id"), "op": op}
+        try:
+            if op not in self.OPS: raise ValueError(f"unknown op {op!r}; expected one of {', '.join(self.OPS)}")
+            res["result"] = getattr(self, "op_" + op)(req); res["ok"] = True
+        except (Exception, SystemExit) as e:
+            res["ok"] = False; res["error"] = f"{type(e).__name__}: {e}"
+        res["ms"] = round((time.perf_counter() - t) * 1000, 2)
+        with self.lock: self.served += 1
+        return res
+
+    def _d2(self) -> Plan2:
+        if self.p2 is None: raise FileNotFoundError(f"Config not found: {self.paths['d2']}")
+        return self.p2
+
+    def _d3_cfg(self, req: Dict) -> Dict:
+        if self.p3 is None: raise FileNotFoundError(f"Config not found: {self.paths['d3']}")
+        cfg = merge(self.p3, _overrides(req, ("global", "shopping_bids", "sweep")))
+        patches = req.get("bids") or {}
+        if patches:
+            known = {str(it.get("product_group","")).strip() for it in cfg.get("shopping_bids", []) or []}
+            missing = set(patches) - known
+            if missing: raise KeyError(f"unknown product groups: {', '.join(sorted(missing))}")
+            cfg["shopping_bids"] = [merge(it, patches.get(str(it.get("product_group","")).strip())) for it in cfg.get("shopping_bids", []) or []]
+        return cfg
+
+    def op_forecast(self, req: Dict) -> Dict:
+        """Deliverable 1 forecasts under overrides of budgets, filters, targeting, brand or competitor."""
+        sheets = FORECAST_SHEETS if req.get("sheets") is None else req["sheets"]
+        unknown = [name for name in sheets if name != "AdGroups" and name not in FORECAST_SHEETS]
+        if unknown: raise KeyError(f"unknown sheets {', '.join(map(repr, unknown))}; expected AdGroups or {', '.join(FORECAST_SHEETS)}")
+        plan, rerun = self.p1.derive(merge(self.p1.cfg, _overrides(req, ("budgets", "filters", "targeting", "brand", "competitor", "inputs"))))
+        df = plan.states[-1]; out = {"keywords": len(df), "rerun": rerun}
+        fc = d1.forecasts(df, plan.cfg, plan.idx) if set(sheets) & set(FORECAST_SHEETS) else {}
+        for name in sheets: out[name] = records(df[d1.ADGROUP_COLS] if name == "AdGroups" else fc[name])
+        return out
+
+    def op_themes(self, req: Dict) -> Dict:
+        """Deliverable 2 keywords and asset groups under overrides of themes, modifiers, generation or gkp; "names" limits the themes."""
+        p2 = self._d2(); cfg = merge(p2.cfg, _overrides(req, ("themes", "modifiers", "generation", "gkp")))
+        themes = d2.collect_themes(cfg)
+        if req.get("names"): names = set(req["names"]); themes = [(t, it) for t, it in themes if it.get("name") in names]
+        rows, groups = d2.merge_themes(d2.build_theme(t, it, p2.context(cfg)) for t, it in themes)
+        return {"keywords": [dict(zip(("theme_type","theme_name","keyword","match_type","landing_url","priority"), r)) for r in rows], "asset_groups": groups}
+
+    def op_bids(self, req: Dict) -> Dict:
+        """Deliverable 3 bid rows under overrides of global, shopping_bids, or per-product-group "bids" patches."""
+        return {"rows": [dict(zip(d3.BID_COLS, r)) for r in d3.compute_rows(self._d3_cfg(req))]}
+
+    def op_sweep(self, req: Dict) -> Dict:
+        grid, pg, res = d3.sweep(self._d3_cfg(req))
+        return {"scenarios": [dict(zip(d3.SWEEP_PARAMS, v)) for v in zip(*(grid[k].tolist() for k in d3.SWEEP_PARAMS))], "product_groups": pg["name"].tolist(),
+                **{k: res[v].tolist() for k, v in (("suggested_cpc", "sugg"), ("clicks_per_day", "clicks"), ("expected_roas", "roas"), ("notes", "note"))}}
+
+    def op_update(self, req: Dict) -> Dict:
+        """Make overrides the new resident state: {"d1": {...}, "d2": {...}, "d3": {...}}."""
+        out: Dict[str, Any] = {}
+        if req.get("d1"):
+            plan, out["d1_rerun"] = self.p1.derive(merge(self.p1.cfg, req["d1"]))
+            with self.lock: self.p1 = plan
+        if req.get("d2"):
+            p2 = Plan2(merge(self._d2().cfg, req["d2"]))
+            with self.lock: self.p2 = p2
+        if req.get("d3"):
+            cfg = self._d3_cfg(req["d3"])
+            with self.lock: self.p3 = cfg
+        return out
+
+    def op_reload(self, req: Dict) -> Dict:
+        return self.reload()
+
+    def op_status(self, req: Dict) -> Dict:
+        return {"configs": self.paths, "keywords": len(self.p1.states[-1]), "themes": len(d2.collect_themes(self.p2.cfg)) if self.p2 else None,
+                "product_groups": len(self.p3.get("shopping_bids", []) or []) if self.p3 else None, "served": self.served}
+
+def _dump(res: Dict) -> str:
+    return json.dumps(res, ensure_ascii=False, default=str)
+
+def _parse(line: str) -> Dict:
+    try: req = json.loads(line)
+    except ValueError as e: return {"op": "invalid", "error": f"invalid JSON: {e}"}
+    return req if isinstance(req, dict) else {"op": "invalid", "error": "request must be a JSON object"}
+
+async def serve_stdio(server: PlanServer, pool: ThreadPoolExecutor) -> None:
+    """One JSON request per stdin line, one JSON response per stdout line (in completion order; match on "id")."""
+    loop = asyncio.get_running_loop(); pending = set()
+
+    async def one(req: Dict) -> None:
+        res = {"id": req.get("id"), "ok": False, "error": req["error"]} if req.get("op") == "invalid" else await loop.run_in_executor(pool, server.handle, req)
+        sys.stdout.write(_dump(res) + "\n"); sys.stdout.flush()
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line: break
+        if not line.strip(): continue
+        task = asyncio.ensure_future(one(_parse(line))); pending.add(task); task.add_done_callback(pending.discard)
+    if pending: await asyncio.gather(*pending)
+
+async def serve_http(server: PlanServer, pool: ThreadPoolExecutor, host: str, port: int) -> None:
+    """POST /<op> with a JSON body (or GET /status); the response body is the JSON result."""
+    loop = asyncio.get_running_loop()
+
+    async def on_conn(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        status, res = 200, None
+        try:
+            method, path, _ = (await reader.readline()).decode("latin1").split(" ", 2)
+            headers = {}
+            while True:
+                h = (await reader.readline()).decode("latin1").strip()
+                if not h: break
+                k, _, v = h.partition(":"); headers[k.strip().lower()] = v.strip()
+            body = (await reader.readexactly(int(headers.get("content-length", 0)))).decode("utf-8") if method == "POST" else ""
+            req = _parse(body) if body.strip() else {}
+            if path.strip("/"): req["op"] = path.strip("/").split("?")[0]
+            if req.get("op") == "invalid": status, res = 400, {"ok": False, "error": req["error"]}
+            else:
+                res = await loop.run_in_executor(pool, server.handle, req)
+                if not res["ok"]: status = 400
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, res = 400, {"ok": False, "error": f"bad request: {e}"}
+        data = _dump(res).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Bad Request'}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        try: await writer.drain()
+        finally: writer.close()
+
+    srv = await asyncio.start_server(on_conn, host, port)
+    print(f"Plan server listening on http://{host}:{port}", file=sys.stderr, flush=True)
+    async with srv: await srv.serve_forever()
+
+def main() -> None:
+    ap = argparse.ArgumentParser("Plan server – resident deliverable 1/2/3 state for fast what-if requests")
+    ap.add_argument("--config", default="config.yaml", help="deliverable 1 config")
+    ap.add_argument("--d2-config", default="configs/d2.yaml"); ap.add_argument("--d3-config", default="configs/d3.yaml")
+    ap.add_argument("--http", default=None, metavar="HOST:PORT", help="serve HTTP instead of JSON lines on stdin/stdout")
+    ap.add_argument("--workers", type=int, default=4, help="requests computed concurrently")
+    ap.add_argument("--no-cache", action="store_true", help="reparse inputs instead of using the on-disk parse cache")
+    args = ap.parse_args()
+    if args.no_cache: plan_cache.configure(enabled=False)
+
+    t = time.perf_counter(); server = PlanServer(args.config, args.d2_config, args.d3_config)
+    print(f"Plan state loaded in {time.perf_counter() - t:.2f}s", file=sys.stderr, flush=True)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        try:
+            if args.http:
+                host, _, port = args.http.rpartition(":")
+                asyncio.run(serve_http(server, pool, host or "127.0.0.1", int(port)))
+            else: asyncio.run(serve_stdio(server, pool))
+        except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    main()
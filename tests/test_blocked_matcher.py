@@ -0,0 +1,38 @@
+import pickle, random
+
+from build_deliverable2 import BlockedMatcher, blocked_matcher, read_terms_csv
+
+
+def naive(k, terms):
+    return any(b in k for b in terms)
+
+
+def test_long_terms():
+    long = "x" * 2000
+    m = BlockedMatcher({long, "a" * 600 + "b", "a" * 600 + "c"})
+    assert m.search("y" + long + "y")
+    assert not m.search("x" * 1999)
+    assert m.search("z" + "a" * 600 + "c")
+    assert not m.search("a" * 600)
+
+
+def test_empty_sets():
+    assert not BlockedMatcher(()).search("anything")
+    assert BlockedMatcher({""}).search("")
+    assert BlockedMatcher({"", "zz"}).search("anything")
+
+
+def test_matches_naive_scan():
+    rng = random.Random(7)
+    terms = {"".join(rng.choice("ab ") for _ in range(rng.randint(1, 6))) for _ in range(40)}
+    m = blocked_matcher(frozenset(terms))
+    for _ in range(2000):
+        k = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 20)))
+        assert m.search(k) == naive(k, terms), k
+
+
+def test_bundled_terms():
+    terms = read_terms_csv("brand_keywords.csv") | read_terms_csv("competitor_keywords.csv") | {"used", "second hand"}
+    m = pickle.loads(pickle.dumps(blocked_matcher(frozenset(terms))))
+    kws = ["kids shoes", "used kids shoes", "running shoes second hand", "school bag", "nike shoes", "boat earphones"]
+    assert [m.search(k) for k in kws] == [naive(k, terms) for k in kws]
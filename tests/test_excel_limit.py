@@ -0,0 +1,24 @@
+import pytest
+
+import build_deliverable1 as d1
+
+
+@pytest.fixture(scope="module")
+def plan():
+    cfg = d1.load_cfg("config.yaml")
+    df = d1.stage_ingest(None, cfg)
+    for _, _, fn in d1.BUILD_STAGES[1:]: df = fn(df, cfg)
+    return cfg, df
+
+
+@pytest.mark.parametrize("writer", ["xlsxwriter", "openpyxl"])
+def test_sheet_past_row_limit(plan, tmp_path, monkeypatch, writer):
+    cfg, df = plan
+    if writer == "openpyxl": monkeypatch.setattr(d1, "xlsxwriter", None)
+    out = tmp_path / "plan.xlsx"
+    monkeypatch.setattr(d1, "EXCEL_MAX_ROWS", len(df))  # AdGroups needs len(df) + 1 with its header
+    with pytest.raises(ValueError, match="AdGroups.*--format csv"): d1.write_excel(str(out), df, cfg)
+    assert not out.exists()
+    monkeypatch.setattr(d1, "EXCEL_MAX_ROWS", len(df) + 1)
+    d1.write_excel(str(out), df, cfg)
+    assert out.exists()
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import build_deliverable1 as d1
+from gkp_numbers import parse_num, to_num_series
+
+CELLS = ["500", "12.34", "", None, np.nan, pd.NA, " 7 ", "₹1,234.50", "Rs. 12", "rs12", "12 INR", "1K – 10K", "1k-3k", "2.5M",
+         "1b", "--", "—", "-5", "+.5", "5.", ".", "1e3", "1E-2", "inf", "nan", "1_000", "0x10", "١٢", "²", "1 2", "₹", "12 to 14",
+         "abc", "3.4.5", "multi\nline"]
+
+
+def as_floats(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def test_matches_parse_num():
+    s = pd.Series(CELLS, dtype=object)
+    for scale in (1.0, 1e-6):
+        assert np.array_equal(to_num_series(s, scale).to_numpy(), as_floats(parse_num(v, scale) for v in CELLS), equal_nan=True)
+    no_newline = pd.Series(CELLS[:-1] * 3, index=range(5, 5 + 3 * (len(CELLS) - 1)), dtype=object)
+    got = to_num_series(no_newline)
+    assert got.index.equals(no_newline.index)
+    assert np.array_equal(got.to_numpy(), as_floats(map(parse_num, no_newline)), equal_nan=True)
+    assert to_num_series(pd.Series([], dtype=object)).empty
+    assert to_num_series(pd.Series([1, 2], dtype="int64"), 0.5).tolist() == [0.5, 1.0]
+
+
+def best_of(fn, n=3):
+    return min((lambda t: (fn(), time.perf_counter() - t)[1])(time.perf_counter()) for _ in range(n))
+
+
+def test_faster_than_per_cell():
+    rng = np.random.default_rng(0)
+    vol = pd.Series(np.where(rng.random(100_000) < 0.1, "", rng.choice(["50", "500", "5000", "50000"], 100_000)), dtype=object)
+    bids = pd.Series(rng.choice(["₹12.50", "Rs. 7", "1,204.75 INR", "--", "", "3.5k", "1K – 10K", "8.25"], 100_000), dtype=object)
+    for s in (vol, bids):
+        assert np.array_equal(to_num_series(s).to_numpy(), pd.to_numeric(s.map(d1.to_num), errors="coerce").to_numpy(float), equal_nan=True)
+        assert best_of(lambda: to_num_series(s)) < best_of(lambda: s.map(d1.to_num))
@@ -0,0 +1,16 @@
+import pytest
+
+from build_deliverable3 import sweep_values
+
+
+def test_axes():
+    assert sweep_values(None, 2.0).tolist() == [2.0]
+    assert sweep_values(1.5, 2.0).tolist() == [1.5]
+    assert sweep_values([1, 2], 0).tolist() == [1.0, 2.0]
+    assert sweep_values({"start": 1, "stop": 2, "step": 0.5}, 0).tolist() == [1.0, 1.5, 2.0]
+    assert sweep_values({"start": 3, "stop": 1, "num": 3}, 0).tolist() == [3.0, 2.0, 1.0]
+
+
+@pytest.mark.parametrize("spec", [{"start": 3, "stop": 1, "step": 0.5}, {"start": 1, "stop": 3, "num": 0}, {"start": 1, "stop": 3, "step": 0}, []])
+def test_empty_axis_rejected(spec):
+    with pytest.raises(ValueError): sweep_values(spec, 1.0)
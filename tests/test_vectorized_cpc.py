@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import build_deliverable1 as d1
+
+COLUMNS = ["intent", "ad_group", "campaign", "match_type", "suggested_cpc_low_inr", "suggested_cpc_high_inr", "suggested_max_cpc_inr"]
+
+
+def row_loop(df, cfg):
+    """The pre-vectorization build(): intent_of/bucket_of/match_type/cpc_suggest applied one keyword at a time."""
+    bt = [cfg["brand"]["name"], *cfg["brand"].get("brand_terms", [])]
+    ct = [cfg["competitor"]["name"], *cfg["competitor"].get("competitor_terms", [])]
+    cities = cfg["targeting"].get("locations", [])
+    out = {c: [] for c in COLUMNS}
+    for k, lo, hi in zip(df["keyword"], df["top_of_page_bid_low"], df["top_of_page_bid_high"]):
+        i = d1.intent_of(k, bt, ct, cities)
+        if i == "Brand": ad = "Brand Terms"
+        elif i == "Competitor": ad = "Competitor Terms"
+        elif i == "Location":
+            city = next((c for c in cities if c.lower() in k), None) or ("Bengaluru" if "bangalore" in k else "General")
+            ad = f"Location - {city}"
+        elif i == "LongTail": ad = "Long-Tail Informational Queries"
+        else: ad = f"Category - {d1.bucket_of(k)}"
+        l, h, m = d1.cpc_suggest(i, lo, hi)
+        for c, v in zip(COLUMNS, (i, ad, d1.CAMPAIGNS.get(i, "Search - Other"), d1.match_type(i, k), l, h, m)):
+            out[c].append(v)
+    return out
+
+
+@pytest.fixture(scope="module")
+def cfg():
+    return d1.load_cfg("config.yaml")
+
+
+@pytest.fixture(scope="module")
+def ingested(cfg):
+    df = d1.stage_ingest(None, cfg)
+    assert len(df) > 100, "bundled CSVs did not parse"
+    return df
+
+
+def check(df, cfg):
+    ref = row_loop(df, cfg)
+    got = d1.stage_cpc(d1.stage_classify(df.copy(), cfg), cfg)
+    for c in COLUMNS:
+        assert got[c].tolist() == ref[c], c
+
+
+def test_bundled_csvs(ingested, cfg):
+    check(ingested, cfg)
+
+
+def test_bid_fallbacks(ingested, cfg):
+    brand, city = cfg["brand"]["name"].lower(), cfg["targeting"]["locations"][0].lower()
+    kws = [f"{brand} whey", "how to use creatine", f"whey protein {city}", "protein powder for gym beginners today", "fish oil"]
+    bids = [(None, None), (12.345, None), (None, 40.005), (0.125, 0.135), (1.005, 2.675)]
+    df = pd.DataFrame({"keyword": [k for k in kws for _ in bids],
+                       "top_of_page_bid_low": [lo for _ in kws for lo, _ in bids],
+                       "top_of_page_bid_high": [hi for _ in kws for _, hi in bids]}, dtype=object)
+    check(pd.concat([ingested.head(50), df], ignore_index=True), cfg)